@@ -24,6 +24,13 @@ from dnload.common import set_verbose
 from dnload.compiler import Compiler
 from dnload.custom_help_formatter import CustomHelpFormatter
 from dnload.glsl import Glsl
+from dnload.glsl_cache import GlslCache
+from dnload.glsl_cache import glsl_cache_directory
+from dnload.glsl_search import glsl_search
+from dnload.glsl_stats import GlslStats
+from dnload.glsl_stats import GLSL_STATS_PHASES
+from dnload.glsl_stats import get_glsl_stats
+from dnload.glsl_stats import set_glsl_stats
 from dnload.library_definition import g_library_definitions
 from dnload.linker import Linker
 from dnload.platform_var import g_osarch
@@ -767,26 +774,45 @@ def generate_elfling(output_file, compiler, elfling, definition_ld):
     asm.incorporate(additional_asm, "_incorporated", ELFLING_UNCOMPRESSED)
     return asm
 
-def generate_glsl(filenames, preprocessor, definition_ld, mode, inlines, renames, simplifys):
-    """Generate GLSL, processing given GLSL source files."""
+def generate_glsl(filenames, preprocessor, definition_ld, mode, inlines, renames, simplifys, renamer, jobs, cache, search=None):
+    """Generate GLSL, processing given GLSL source files.
+    If search compression format is given, limits are searched for the output that compresses smallest."""
     glsl_db = Glsl()
+    lst = []
     for ii in filenames:
         # If there's a listing, the order is filename, output name, varname
         if is_listing(ii):
             if 3 == len(ii):
-                glsl_db.read(preprocessor, definition_ld, ii[0], ii[1], ii[2])
+                lst += [(ii[0], ii[1], ii[2])]
             elif 2 == len(ii):
-                glsl_db.read(preprocessor, definition_ld, ii[0], ii[1])
+                lst += [(ii[0], ii[1], None)]
             else:
                 raise RuntimeError("invalid glsl file listing input: '%s'" % (str(ii)))
         # Otherwise only filename exists.
         else:
-            glsl_db.read(preprocessor, definition_ld, ii)
+            lst += [(ii, None, None)]
+    # Sources are preprocessed in one batch where possible, starting a preprocessor for each is slow.
+    glsl_db.readSources(preprocessor, definition_ld, lst)
+    # Searching memoises every combination separately, limits given are not used.
+    if search:
+        key = None
+        if cache:
+            key = glsl_db.generateCacheKey([VERSION_REVISION, VERSION_DATE, definition_ld, mode, search])
+        glsl_db.parse()
+        glsl_search(glsl_db, mode, jobs, cache, key, search)
+        return glsl_db
+    # Output can be reused if preprocessed sources and settings have not changed.
+    if cache:
+        cache_key = glsl_db.generateCacheKey([VERSION_REVISION, VERSION_DATE, definition_ld, mode, inlines, renames, simplifys, renamer])
+        if glsl_db.loadCache(cache, cache_key):
+            return glsl_db
     glsl_db.parse()
-    glsl_db.crunch(mode, inlines, renames, simplifys)
+    glsl_db.crunch(mode, inlines, renames, simplifys, jobs, renamer)
+    if cache:
+        glsl_db.storeCache(cache, cache_key)
     return glsl_db
 
-def generate_glsl_extract(fname, preprocessor, definition_ld, mode, inlines, renames, simplifys):
+def generate_glsl_extract(fname, preprocessor, definition_ld, mode, inlines, renames, simplifys, renamer, jobs, cache, search=None):
     """Generate GLSL, extracting from source file."""
     src_path, src_basename = os.path.split(fname)
     if src_path:
@@ -814,7 +840,7 @@ def generate_glsl_extract(fname, preprocessor, definition_ld, mode, inlines, ren
             else:
                 filenames += [[glsl_filename, glsl_output_name]]
     if filenames:
-        glsl_db = generate_glsl(filenames, preprocessor, definition_ld, mode, inlines, renames, simplifys)
+        glsl_db = generate_glsl(filenames, preprocessor, definition_ld, mode, inlines, renames, simplifys, renamer, jobs, cache, search)
         glsl_db.write()
 
 def generate_include_rand(implementation_rand, target_search_path, definition_ld):
@@ -1043,10 +1069,16 @@ def main():
     parser.add_argument("--nice-exit", action="store_true", help="Do not use debugger trap, exit with proper system call.")
     parser.add_argument("--nice-filedump", action="store_true", help="Do not use dirty tricks in compression header, also remove filedumped binary when done.")
     parser.add_argument("--no-glesv2", action="store_true", help="Do not probe for OpenGL ES 2.0, always assume regular GL.")
+    parser.add_argument("--no-glsl-cache", action="store_true", help="Do not cache crunched GLSL output between runs.")
+    parser.add_argument("--glsl-jobs", default=1, type=int, help="Number of processes to crunch independent GLSL source chains with. Limits apply per group of chains, output does not depend on number of processes.\n(default: %(default)s)")
     parser.add_argument("--glsl-mode", default="full", choices=("none", "nosquash", "full"), help="GLSL crunching mode.\n(default: %(default)s)")
     parser.add_argument("--glsl-inlines", default=-1, type=int, help="Maximum number of inline operations to do for GLSL.\n(default: unlimited)")
+    parser.add_argument("--glsl-rename", default="greedy", choices=("greedy", "graph"), help="GLSL renaming method:\n\tgreedy:\n\t\tRename one name at a time to the most frequent letter that does not conflict.\n\tgraph:\n\t\tRename all names at once by colouring an interference graph of the names.\n(default: %(default)s)")
     parser.add_argument("--glsl-renames", default=-1, type=int, help="Maximum number of rename operations to do for GLSL.\n(default: unlimited)")
+    parser.add_argument("--glsl-search", action="store_true", help="Search GLSL crunching limits and renaming methods for the output that compresses smallest with the unpack header compression. Limits given are not used.\nSearch is run with --glsl-jobs processes.")
     parser.add_argument("--glsl-simplifys", default=-1, type=int, help="Maximum number of simplify operations to do for GLSL.\n(default: unlimited)")
+    parser.add_argument("--glsl-stats", default=None, help="Write timing and statistics of GLSL processing phases into given JSON file.")
+    parser.add_argument("--glsl-profile", default=None, choices=GLSL_STATS_PHASES, help="Run given GLSL processing phase under cProfile and print the profile.")
     parser.add_argument("--linux", action="store_true", help="Try to target Linux if not in Linux. Equal to '-O linux'.")
     parser.add_argument("-o", "--output-file", default=[], nargs="*", help="Name of output file to generate\nIf the name specified features a path, it will be used verbatim. Otherwise the binary will be created in the same path as source file(s) compiled.\nIf only processing GLSL files, this parameter can be specified multiple times, but must be specified exactly once per input GLSL file.")
     parser.add_argument("-O", "--operating-system", help="Try to target given operating system insofar cross-compilation is possible.")
@@ -1082,10 +1114,21 @@ def main():
     compilation_mode = args.method
     compression = args.unpack_header
     elfling = args.elfling
+    glsl_cache = None
+    if not args.no_glsl_cache:
+        glsl_cache = GlslCache(glsl_cache_directory())
     glsl_inlines = args.glsl_inlines
+    glsl_jobs = args.glsl_jobs
+    glsl_renamer = args.glsl_rename
     glsl_renames = args.glsl_renames
+    glsl_search_compression = None
+    if args.glsl_search:
+        glsl_search_compression = compression
     glsl_simplifys = args.glsl_simplifys
     glsl_mode = args.glsl_mode
+    glsl_stats = args.glsl_stats
+    if glsl_stats or args.glsl_profile:
+        set_glsl_stats(GlslStats(args.glsl_profile))
     implementation_rand = args.rand
     include_directories += args.include_directory
     libraries = args.library
@@ -1164,11 +1207,13 @@ def main():
             raise RuntimeError("specified output files '%s' must match input glsl files '%s'" % (str(output_file_list), str(source_files_glsl)))
         if output_file_list:
             source_files_glsl = zip(source_files_glsl, output_file_list)
-        glsl_db = generate_glsl(source_files_glsl, preprocessor, definition_ld, glsl_mode, glsl_inlines, glsl_renames, glsl_simplifys)
+        glsl_db = generate_glsl(source_files_glsl, preprocessor, definition_ld, glsl_mode, glsl_inlines, glsl_renames, glsl_simplifys, glsl_renamer, glsl_jobs, glsl_cache, glsl_search_compression)
         if output_file_list:
             glsl_db.write()
         else:
             print("".join(glsl_db.format()).strip())
+        if glsl_stats:
+            get_glsl_stats().write(glsl_stats)
         sys.exit(0)
     # If no GLSL, there must be exactly one output file or nothing.
     elif output_file_list:
@@ -1283,7 +1328,9 @@ def main():
         print("Analyzing source files: %s" % (str(source_files)))
     # Prepare GLSL headers before preprocessing.
     for ii in source_files:
-        generate_glsl_extract(ii, preprocessor, definition_ld, glsl_mode, glsl_inlines, glsl_renames, glsl_simplifys)
+        generate_glsl_extract(ii, preprocessor, definition_ld, glsl_mode, glsl_inlines, glsl_renames, glsl_simplifys, glsl_renamer, glsl_jobs, glsl_cache, glsl_search_compression)
+    if glsl_stats:
+        get_glsl_stats().write(glsl_stats)
     # Search symbols from source files.
     symbols = set()
     for ii in source_files:
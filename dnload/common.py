@@ -166,12 +166,17 @@ def generate_temporary_filename(fname):
         return g_temporary_directory + "/" + os.path.basename(fname)
     return fname
 
-def run_command(lst, decode_output=True):
-    """Run program identified by list of command line parameters."""
+def run_command(lst, decode_output=True, input_data=None):
+    """Run program identified by list of command line parameters. Input data, if given, is fed to standard input."""
     if is_verbose():
         print("Executing command: %s" % (" ".join(lst)))
-    proc = subprocess.Popen(lst, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (proc_stdout, proc_stderr) = proc.communicate()
+    stdin = None
+    if not (input_data is None):
+        stdin = subprocess.PIPE
+        if isinstance(input_data, str):
+            input_data = input_data.encode()
+    proc = subprocess.Popen(lst, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    (proc_stdout, proc_stderr) = proc.communicate(input_data)
     if decode_output and not isinstance(proc_stdout, str):
         proc_stdout = proc_stdout.decode()
     if decode_output and not isinstance(proc_stderr, str):
@@ -1,21 +1,33 @@
+import bisect
+import multiprocessing
 import re
 
 from dnload.common import is_listing
 from dnload.common import is_verbose
-from dnload.glsl_block_assignment import is_glsl_block_assignment
+from dnload.common import set_verbose
 from dnload.glsl_block_control import is_glsl_block_control
 from dnload.glsl_block_declaration import is_glsl_block_declaration
 from dnload.glsl_block_function import is_glsl_block_function
 from dnload.glsl_block_inout import is_glsl_block_inout
 from dnload.glsl_block_inout import is_glsl_block_inout_struct
+from dnload.glsl_block_inout import is_glsl_block_inout_typed
 from dnload.glsl_block_scope import is_glsl_block_scope
 from dnload.glsl_block_struct import is_glsl_block_struct
 from dnload.glsl_block_source import glsl_read_source
+from dnload.glsl_block_source import glsl_read_sources
 from dnload.glsl_block_source import is_glsl_block_source
 from dnload.glsl_block_uniform import is_glsl_block_uniform
+from dnload.glsl_cache import glsl_cache_key
+from dnload.glsl_def_use import GlslDefUse
 from dnload.glsl_name import is_glsl_name
 from dnload.glsl_name_strip import is_glsl_name_strip
+from dnload.glsl_name_table import GlslNameTable
+from dnload.glsl_name_table import has_position_in_range
 from dnload.glsl_source_chain import GlslSourceChain
+from dnload.glsl_stats import GlslStats
+from dnload.glsl_stats import get_glsl_stats
+from dnload.glsl_stats import glsl_stats_count
+from dnload.glsl_stats import set_glsl_stats
 
 ########################################
 # Glsl #################################
@@ -28,40 +40,226 @@ class Glsl:
         """Constructor."""
         self.__chains = []
         self.__sources = []
+        # Collected names are kept between inline passes and updated incrementally.
+        self.__name_strips = None
+        self.__inline_candidates = []
+        self.__name_blocks = {}
+        self.__name_owners = {}
+        self.__source_level_name_strips = {}
+        self.__name_tables = None
+        # Def-use chains are only valid for the duration of one inline pass.
+        self.__def_uses = {}
+        # Block type names are not declared names, they are tracked separately.
+        self.__block_type_names = set()
+        # Number of inlines, renames and simplifys performed by last crunch.
+        self.__operation_counts = (0, 0, 0)
+        # Letter counts are kept up to date while renaming.
+        self.__letter_counts = None
+        self.__letters_sorted = None
+
+    def addSource(self, op):
+        """Add a source block."""
+        self.__sources += [op]
+
+    def assembleChains(self):
+        """Assemble sources into source chains."""
+        source_dict = {}
+        for ii in self.__sources:
+            if ii.isCommonChainName():
+                continue
+            chain_name = ii.getChainName()
+            if chain_name in source_dict:
+                source_dict[chain_name].addSource(ii)
+            else:
+                source_dict[chain_name] = GlslSourceChain(ii)
+        for ii in self.__sources:
+            if not ii.isCommonChainName():
+                continue
+            for jj in source_dict.keys():
+                source_chain = source_dict[jj]
+                if source_chain.isSourceSlotFree(ii):
+                    source_chain.addSource(ii)
+        self.__chains = source_dict.values()
+
+    def beginPhase(self, name, parsed=True):
+        """Begin a phase of processing if collecting statistics."""
+        stats = get_glsl_stats()
+        if stats:
+            stats.beginPhase(name, self.measureSize(parsed))
+
+    def buildInterferenceGraph(self, strips):
+        """Build interference graph of given name strips.
+        Return listing of sets of interfering strip indices, listing of sets of sources each strip is declared in
+        and listing of sets of sources each strip interferes with as a whole."""
+        # Gather positions of all names of the strips per source, both in position order and per strip.
+        occurrences = {}
+        declared_in = []
+        global_in = []
+        for ii in range(len(strips)):
+            declared_in += [set()]
+            global_in += [set()]
+        for source in self.__sources:
+            table = self.getNameTable(source)
+            lst = []
+            declared_positions = {}
+            used_positions = {}
+            uniforms = set()
+            for ii in range(len(strips)):
+                for jj in strips[ii].getNameList():
+                    for (position, declared, uniform) in table.getPendingPositions(jj):
+                        lst += [(position, declared, ii)]
+                        if declared:
+                            declared_positions.setdefault(ii, []).append(position)
+                            declared_in[ii].add(id(source))
+                        else:
+                            used_positions.setdefault(ii, []).append(position)
+                        if uniform:
+                            uniforms.add(ii)
+            lst.sort()
+            # Strips used but not declared within the source, i.e. declared in headers.
+            foreign = {}
+            for (ii, jj) in used_positions.items():
+                jj.sort()
+                if not (ii in declared_positions):
+                    foreign[ii] = jj
+            occurrences[id(source)] = (list(map(lambda x: x[0], lst)), lst, foreign, uniforms)
+        ret = []
+        for ii in range(len(strips)):
+            ret += [set()]
+        for ii in range(len(strips)):
+            for block in strips[ii].getBlockList():
+                parent = find_parent_scope(block)
+                source = parent.getSourceFile()
+                table = self.getNameTable(source)
+                (first, last) = table.getPositionRange(parent)
+                # Same rules as name table conflicts: declarations anywhere within the parent, uses from the block onward.
+                position = table.getPositionRange(block)
+                start = last + 1
+                if position and (first < position[0]) and (position[0] <= last):
+                    start = position[0]
+                (positions, lst, foreign, uniforms) = occurrences[id(source)]
+                if not is_glsl_block_source(parent):
+                    for jj in range(bisect.bisect_left(positions, first + 1), bisect.bisect_right(positions, last)):
+                        (position, declared, kk) = lst[jj]
+                        if declared or (position >= start):
+                            ret[ii].add(kk)
+                    continue
+                # Source level blocks interfere with everything declared within the source, which is not listed.
+                global_in[ii].add(id(source))
+                for (kk, jj) in foreign.items():
+                    if has_position_in_range(jj, start, last):
+                        ret[ii].add(kk)
+                # Same rules as conflicts between sources.
+                for other in self.__sources:
+                    if other == parent:
+                        continue
+                    if (not parent.getType()) or (not other.getType()):
+                        global_in[ii].add(id(other))
+                    elif is_glsl_block_uniform(block) and self.findCommonChain(other, parent):
+                        ret[ii].update(occurrences[id(other)][3])
+        # Interference is symmetric, a strip never interferes with itself.
+        for ii in range(len(strips)):
+            ret[ii].discard(ii)
+            for jj in ret[ii]:
+                ret[jj].add(ii)
+        return (ret, declared_in, global_in)
+
+    def collect(self):
+        """Collect all names into name strips. Return merged listing in collection order."""
+        collected = []
+        visible = {}
+        for ii in self.__sources:
+            # First pass - collect from generic sources only
+            if ii.getType():
+                continue
+            collect_pass = ii.collect()
+            for jj in collect_pass:
+                # Successive sources may only append to names declared on source level.
+                if is_source_level_name_strip(jj):
+                    symbol = jj.getName().getSymbol()
+                    visible[symbol] = visible.get(symbol, []) + [jj]
+            collected += collect_pass
+        # Second pass - collect from non-generic sources, appending to names declared on generic source level.
+        for ii in self.__sources:
+            if ii.getType():
+                collected += ii.collect(visible)
+        # Merge multiple matching inout names.
+        ret = self.mergeCollectedNames(collected)
+        # Collect all member accesses for members and set them to the blocks.
+        for ii in ret:
+            self.collectMemberAccesses(ii)
+        return ret
+
+    def collectMemberAccesses(self, op):
+        """Collect member accesses of given name strip and set them to the block if applicable."""
+        block = op.getBlock()
+        if not (is_glsl_block_inout_struct(block) or is_glsl_block_struct(block)):
+            return
+        lst = op.collectMemberAccesses()
+        block.setMemberAccesses(lst)
 
     def count(self):
         """Count instances of alpha letters within the code."""
-        source = "".join(map(lambda x: x.format(False), self.__sources))
-        ret = {}
-        for ii in source:
+        if self.__letter_counts is None:
+            sink = []
+            for ii in self.__sources:
+                ii.emit(sink, False)
+            ret = {}
+            for ii in "".join(sink):
+                if ii.isalpha():
+                    if ii in ret:
+                        ret[ii] += 1
+                    else:
+                        ret[ii] = 1
+            self.__letter_counts = ret
+        return self.__letter_counts
+
+    def countLock(self, names, op):
+        """Update letter counts for given names being locked into given string."""
+        if self.__letter_counts is None:
+            return
+        for ii in op:
             if ii.isalpha():
-                if ii in ret:
-                    ret[ii] += 1
-                else:
-                    ret[ii] = 1
-        return ret
+                self.__letter_counts[ii] = self.__letter_counts.get(ii, 0) + len(names)
+        self.__letters_sorted = None
+
+    def countReset(self):
+        """Forget letter counts after the code has been changed in other ways than renaming."""
+        self.__letter_counts = None
+        self.__letters_sorted = None
 
     def countSorted(self):
         """Get sorted listing of counted alpha letters within the code."""
-        counted = self.count()
-        lst = []
-        # Sort by instance count, length of name, string comparison.
-        for kk in counted.keys():
-            lst += [(counted[kk], -len(kk), kk)]
-        ret = sorted(lst, reverse=True)
-        return list(map(lambda x: x[2], ret))
-
-    def crunch(self, mode="full", max_inlines=-1, max_renames=-1, max_simplifys=-1):
+        if self.__letters_sorted is None:
+            counted = self.count()
+            lst = []
+            # Sort by instance count, length of name, string comparison.
+            for kk in counted.keys():
+                lst += [(counted[kk], -len(kk), kk)]
+            ret = sorted(lst, reverse=True)
+            self.__letters_sorted = list(map(lambda x: x[2], ret))
+        return self.__letters_sorted
+
+    def crunch(self, mode="full", max_inlines=-1, max_renames=-1, max_simplifys=-1, jobs=1, renamer="greedy"):
         """Crunch the source code to smaller state."""
+        # Independent groups of sources are always crunched separately, so output does not depend on number of processes.
+        if "none" != mode:
+            groups = self.groupSources()
+            if 1 < len(groups):
+                self.crunchGroups(groups, jobs, mode, max_inlines, max_renames, max_simplifys, renamer)
+                return
         combines = None
         inlines = None
         renames = None
         simplifys = None
         # Expand unless crunching completely disabled.
         if "none" != mode:
+            self.beginPhase("expand")
             for ii in self.__sources:
                 ii.expandRecursive()
+            self.endPhase()
             # Perform inlining passes.
+            self.beginPhase("inline")
             inlines = 0
             while True:
                 merged = self.inlinePass((max_inlines < 0) or (inlines < max_inlines))
@@ -70,21 +268,28 @@ class Glsl:
                     break
                 # Do another inlining round.
                 inlines += 1
+            self.endPhase()
             # Check that no name is unreferenced.
             if is_verbose():
                 for ii in merged:
                     if ii.getNameCount() <= 1:
                         print("WARNING: identifier '%s' never referenced" % (ii.getName().getName()))
             # Perform simplification passes.
+            self.beginPhase("simplify")
             simplifys = 0
             for ii in self.__sources:
                 if (0 <= max_simplifys) and (simplifys >= max_simplifys):
                     break
                 simplifys += simplify_pass(ii, max_simplifys - simplifys)
+            self.endPhase()
             # After all names have been collected, it's possible to select the best swizzle.
+            self.beginPhase("swizzle")
+            self.countReset()
             swizzle = self.selectSwizzle()
             for ii in self.__sources:
                 ii.selectSwizzle(swizzle)
+            self.countReset()
+            self.endPhase()
             # Print number of block merges.
             if is_verbose():
                 function_merges = []
@@ -105,12 +310,18 @@ class Glsl:
                 if inout_merges:
                     print("GLSL inout connections found: %s" % (str(inout_merges)))
             # Run rename passes until done.
-            renames = 0
-            for ii in merged:
-                if (0 <= max_renames) and (renames >= max_renames):
-                    break
-                self.renamePass(ii)
-                renames += 1
+            self.beginPhase("rename")
+            if "graph" == renamer:
+                renames = self.renameGraph(merged, max_renames)
+            elif "greedy" == renamer:
+                renames = 0
+                for ii in merged:
+                    if (0 <= max_renames) and (renames >= max_renames):
+                        break
+                    self.renamePass(ii)
+                    renames += 1
+            else:
+                raise RuntimeError("unknown GLSL renamer: '%s'" % (renamer))
             # Run member rename passes until done.
             for ii in merged:
                 block = ii.getBlock()
@@ -121,9 +332,13 @@ class Glsl:
                 if (0 > max_renames) or (renames < max_renames):
                     self.renameBlockType(ii.getBlockList())
                     renames += 1
+            self.endPhase()
             # Perform recombine passes.
+            self.beginPhase("collapse")
             for ii in self.__sources:
                 combines = ii.collapseRecursive(mode)
+            self.endPhase()
+            self.__operation_counts = (inlines, renames, simplifys)
         # Print summary of operations.
         if is_verbose():
             operations = []
@@ -138,6 +353,43 @@ class Glsl:
             if operations:
                 print("GLSL processing done: %s" % (", ".join(operations)))
 
+    def crunchGroups(self, groups, jobs, mode, max_inlines, max_renames, max_simplifys, renamer):
+        """Crunch given groups of source indices in a process pool or in this process, one database per group."""
+        stats = get_glsl_stats()
+        tasks = []
+        for ii in groups:
+            sources = list(map(lambda x: self.__sources[x], ii))
+            # Each process collects statistics of its own, to be merged afterwards.
+            group_stats = None
+            if stats:
+                group_stats = GlslStats(stats.getProfile())
+            tasks += [(sources, mode, max_inlines, max_renames, max_simplifys, renamer, is_verbose(), group_stats)]
+        if 1 < jobs:
+            with multiprocessing.Pool(min(jobs, len(groups))) as pool:
+                results = pool.map(glsl_crunch_group, tasks)
+        else:
+            results = list(map(glsl_crunch_group, tasks))
+            set_glsl_stats(stats)
+        # Crunched sources replace the originals in the same order.
+        operation_counts = [0, 0, 0]
+        for (group, (sources, group_operation_counts, group_stats)) in zip(groups, results):
+            for (index, source) in zip(group, sources):
+                self.__sources[index] = source
+            for ii in range(len(operation_counts)):
+                operation_counts[ii] += group_operation_counts[ii]
+            if group_stats:
+                stats.merge(group_stats)
+        self.__operation_counts = tuple(operation_counts)
+        # Name tables refer to the replaced sources, rebuild on demand.
+        self.__name_tables = None
+        self.assembleChains()
+
+    def endPhase(self, parsed=True):
+        """End current phase of processing if collecting statistics."""
+        stats = get_glsl_stats()
+        if stats:
+            stats.endPhase(lambda: self.measureSize(parsed))
+
     def findCommonChain(self, lhs, rhs):
         """Finds a common chain that contains both given GLSL source files."""
         for ii in self.__chains:
@@ -153,6 +405,13 @@ class Glsl:
                 ret += [ii.generatePrintOutput()]
         return ret
 
+    def generateCacheKey(self, settings):
+        """Generate cache key from all read sources and given listing of settings affecting output."""
+        lst = list(settings)
+        for ii in self.__sources:
+            lst += [ii.getFilename(), ii.getVariableName(), ii.getPreprocessedContent()]
+        return glsl_cache_key(lst)
+
     def getChainLength(self, op):
         """Gets the length of source chain with given name."""
         for ii in self.__chains:
@@ -160,6 +419,66 @@ class Glsl:
                 return ii.getChainLength()
         raise RuntimeError("source chain '%s' not found" % (op))
 
+    def getDefUse(self, parent):
+        """Get def-use chains of given parent. Chains are built on first access within an inline pass."""
+        key = id(parent)
+        if not (key in self.__def_uses):
+            self.__def_uses[key] = GlslDefUse(parent)
+        return self.__def_uses[key]
+
+    def getNameTable(self, source):
+        """Get name table of given source. Name tables are created on first access, after which the block hierarchy must not change."""
+        if self.__name_tables is None:
+            self.__name_tables = {}
+            for ii in self.__sources:
+                self.__name_tables[id(ii)] = GlslNameTable(ii)
+        return self.__name_tables[id(source)]
+
+    def getOperationCounts(self):
+        """Get number of inlines, renames and simplifys performed by last crunch."""
+        return self.__operation_counts
+
+    def getOutputs(self):
+        """Get output of all sources."""
+        return list(map(lambda x: x.formatOutput(), self.__sources))
+
+    def getScopeNames(self, op):
+        """Get sets of names conflicting with given block, name strip or listing anywhere within scope of its blocks."""
+        if is_glsl_name_strip(op) or is_listing(op):
+            if is_glsl_name_strip(op):
+                op = op.getBlockList()
+            ret = [self.__block_type_names]
+            for ii in op:
+                for jj in self.getScopeNames(ii)[1:]:
+                    if not any(map(lambda x: x is jj, ret)):
+                        ret += [jj]
+            return ret
+        parent = find_parent_scope(op)
+        return [self.__block_type_names, self.getNameTable(parent.getSourceFile()).getScopeNames(parent)]
+
+    def getSources(self):
+        """Accessor."""
+        return self.__sources
+
+    def groupSources(self):
+        """Group sources that share a source chain. Return listing of source index listings in source order."""
+        # Generic sources are checked for conflicts against all other sources.
+        if not all(map(lambda x: x.getType(), self.__sources)):
+            return [list(range(len(self.__sources)))]
+        ret = []
+        for ii in range(len(self.__sources)):
+            ret += [[ii]]
+        for ii in self.__chains:
+            group = []
+            remaining = []
+            for jj in ret:
+                if any(map(lambda x: ii.hasSource(self.__sources[x]), jj)):
+                    group += jj
+                else:
+                    remaining += [jj]
+            ret = remaining + [sorted(group)]
+        return sorted(ret)
+
     def hasInlineConflict(self, block, names):
         """Tell if given block has an inlining conflict."""
         # If block is a listing, just go over all options.
@@ -173,136 +492,217 @@ class Glsl:
         if is_glsl_block_source(parent):
             for ii in self.__sources:
                 if (ii != parent) and ((not parent.getType()) or (not ii.getType())):
-                    if has_inline_conflict(ii, block, names):
+                    if has_inline_conflict(self.getDefUse(ii), block, names):
                         return True
-        return has_inline_conflict(parent, block, names)
+        return has_inline_conflict(self.getDefUse(parent), block, names)
 
     def hasNameConflict(self, op, name):
         """Search for name conflicts regarding given name."""
-        # If the input is a GLSL name strip, iterate over its blocks.
-        if is_glsl_name_strip(op):
-            for ii in op.getBlockList():
+        # If the input is a GLSL name strip or a listing, iterate over its blocks.
+        if is_glsl_name_strip(op) or is_listing(op):
+            if is_glsl_name_strip(op):
+                op = op.getBlockList()
+            for ii in op:
                 if self.hasNameConflict(ii, name):
                     return True
             return False
+        if name in self.__block_type_names:
+            return True
         # If the parent is a source block, may need to check conflicts with other sources first.
         parent = find_parent_scope(op)
         if is_glsl_block_source(parent):
             for ii in self.__sources:
                 # Only check other sources.
                 if ii != parent:
+                    table = self.getNameTable(ii)
                     # Checking against header sources always happens.
                     if (not parent.getType()) or (not ii.getType()):
-                        if has_name_conflict(ii, op, name):
+                        if table.hasDeclaredName(name):
                             return True
                     # Uniforms clash within the source chain.
                     elif is_glsl_block_uniform(op):
                         chain = self.findCommonChain(ii, parent)
-                        if chain:
-                            for jj in flatten(ii):
-                                if is_glsl_block_uniform(jj) and jj.hasLockedDeclaredName(name):
-                                    return True
+                        if chain and table.hasUniformName(name):
+                            return True
         # Above checks only work if uniforms are only declared in source scope.
         elif is_glsl_block_uniform(op):
             raise RuntimeError("found uniform block in non-source scope")
         # Always check for conflicts within the parent block anyway.
-        return has_name_conflict(parent, op, name)
+        return self.getNameTable(parent.getSourceFile()).hasNameConflict(parent, op, name)
+
+    def findNameStrips(self, block, name):
+        """Find the name strips collection would add a name used in given block into."""
+        # Locked names never have name strips.
+        if name.isLocked():
+            return []
+        declarer = find_declaring_block(block, name)
+        if declarer:
+            for ii in declarer.getDeclaredNames():
+                if ii == name:
+                    return [self.__name_owners[id(ii)]]
+            raise RuntimeError("block %s declares %s but no declared name matches" % (str(declarer), str(name)))
+        # Names not declared within a typed source are appended to source level names of generic sources.
+        if block.getSourceFile().getType():
+            return self.__source_level_name_strips.get(name.getName(), [])
+        return []
+
+    def indexCollectedNames(self, lst):
+        """Index collected name strips for incremental updates."""
+        self.__name_strips = lst
+        self.__inline_candidates = []
+        self.__name_blocks = {}
+        self.__name_owners = {}
+        self.__source_level_name_strips = {}
+        for ii in lst:
+            for jj in ii.getNameList():
+                self.__name_owners[id(jj)] = ii
+            # Typed sources append to names declared on source level of generic sources.
+            name_string = ii.getName().getName()
+            for jj in ii.getBlockList():
+                parent = jj.getParent()
+                if is_glsl_block_source(parent) and (not parent.getType()):
+                    strips = self.__source_level_name_strips.setdefault(name_string, [])
+                    if not (ii in strips):
+                        strips += [ii]
+            if is_inline_name_strip(ii):
+                self.__inline_candidates += [ii]
+        for ii in self.__sources:
+            for jj in [ii] + ii.getFlattened():
+                for kk in jj.getUsedNames():
+                    self.__name_blocks[id(kk)] = jj
 
     def inline(self, block, names):
         """Perform inlining of block into where it is used."""
         ret = 0
-        parent = find_parent_scope(block)
-        if is_glsl_block_source(parent):
-            for ii in self.__sources:
-                if (ii != parent) and ((not parent.getType()) or (not ii.getType())):
-                    ret += inline_instances(ii, block, names)
-        ret += inline_instances(parent, block, names)
+        inlined = self.__name_owners[id(names[0])]
+        tokens = block.getStatement().getTokens()
+        # Blocks using the inlined name are known, no need to search for them.
+        sites = []
+        visited = set()
+        for ii in names:
+            site = self.__name_blocks[id(ii)]
+            if (site == block) or (site.getParent() == block) or (id(site) in visited):
+                continue
+            visited.add(id(site))
+            sites += [site]
+        added = []
+        for ii in sites:
+            previous = set(map(id, ii.getUsedNames()))
+            for jj in names:
+                if ii.hasUsedNameExact(jj):
+                    ret += ii.replaceUsedNameExact(jj, tokens)
+            for jj in ii.getUsedNames():
+                if not (id(jj) in previous):
+                    added += [(ii, jj)]
         block.removeFromParent()
+        # Forget the inlined name and all names within the removed block.
+        touched = []
+        for ii in names:
+            self.__name_blocks.pop(id(ii), None)
+            self.__name_owners.pop(id(ii), None)
+        for ii in [block] + block.getFlattened():
+            for jj in ii.getUsedNames():
+                self.__name_blocks.pop(id(jj), None)
+                owner = self.__name_owners.pop(id(jj), None)
+                if owner:
+                    owner.removeName(jj)
+                    if not (owner in touched):
+                        touched += [owner]
+        self.__name_strips.remove(inlined)
+        self.__inline_candidates.remove(inlined)
+        # Names copied into use sites go to the name strips collection would have put them into.
+        for (site, name) in added:
+            self.__name_blocks[id(name)] = site
+            for ii in self.findNameStrips(site, name):
+                ii.addName(name)
+                ii.updateNameType(name)
+                self.__name_owners[id(name)] = ii
+                if not (ii in touched):
+                    touched += [ii]
+        for ii in touched:
+            self.collectMemberAccesses(ii)
         return ret
 
     def inlinePass(self, allow_inline):
         """Run inline pass. Return list of merged names if no inlining could be done."""
-        collected = []
-        for ii in self.__sources:
-            # First pass - collect from generic sources only
-            if ii.getType():
-                continue
-            collect_pass = ii.collect()
-            for jj in self.__sources:
-                # Second pass - append from non-generic.
-                if not jj.getType():
-                    continue
-                for kk in collect_pass:
-                    # Successive sources may only append to names declared on source level.
-                    if not is_source_level_name_strip(kk):
-                        continue
-                    jj.collectAppend(kk)
-            collected += collect_pass
-        # Second pass - collect from non-generic sources. Do not append.
-        for ii in self.__sources:
-            if ii.getType():
-                collected += ii.collect()
-        # Merge multiple matching inout names.
-        ret = sorted(self.mergeCollectedNames(collected), reverse=True)
-        # Collect all member accesses for members and set them to the blocks.
-        for ii in ret:
-            block = ii.getBlock()
-            if not (is_glsl_block_inout_struct(block) or is_glsl_block_struct(block)):
-                continue
-            lst = ii.collectMemberAccesses()
-            block.setMemberAccesses(lst)
-        # If inlining is not allowed, just return.
-        if not allow_inline:
-            return ret
-        # Perform inlining if possible.
-        for ii in ret:
-            # Merged instances not ok for inlining.
-            if ii.getBlockCount() > 1:
-                continue
-            block = ii.getBlock()
-            # Must be declaration to be inlined anywhere.
-            if not is_glsl_block_declaration(block):
-                continue
-            # Must be an inline name to be inlined.
-            if not is_inline_name(ii.getName()):
-                continue
-            names = ii.getNameList()
-            # If no inline conflict, perform inline and return nothing to signify another pass can be done.
-            if not self.hasInlineConflict(block, names):
-                self.inline(block, names)
-                return None
+        # Collect names on first pass only, successive passes are updated by inlining.
+        if self.__name_strips is None:
+            self.indexCollectedNames(self.collect())
+        # Hierarchy was modified by previous pass.
+        self.__def_uses = {}
+        # Perform inlining if allowed and possible.
+        if allow_inline:
+            for ii in sorted(self.__inline_candidates, reverse=True):
+                block = ii.getBlock()
+                names = ii.getNameList()
+                # If no inline conflict, perform inline and return nothing to signify another pass can be done.
+                if not self.hasInlineConflict(block, names):
+                    self.inline(block, names)
+                    return None
         # Return merged list of name strips.
-        return ret
+        return sorted(self.__name_strips, reverse=True)
 
-    def inventName(self, block, counted):
-        """Invent a new name when existing names have run out."""
+    def inventName(self, block, counted, excluded=()):
+        """Invent a new name when existing names have run out. Names in excluded are never returned."""
+        # Names declared within the scopes of the blocks always conflict, no need to check them.
+        taken = [excluded] + self.getScopeNames(block)
         for ii in single_character_alphabet():
-            if not self.hasNameConflict(block, ii):
+            if (not is_name_taken(ii, taken)) and (not self.hasNameConflict(block, ii)):
                 return ii
         # Letter followed by a number. Try more frequent names first.
         ii = 0
         while True:
             for jj in counted:
                 name = jj + str(ii)
-                if not self.hasNameConflict(block, name):
+                if (not is_name_taken(name, taken)) and (not self.hasNameConflict(block, name)):
                     return name
             ii += 1
 
+    def loadCache(self, cache, key):
+        """Try to set output of all sources from cache. Return True on success."""
+        lst = cache.load(key)
+        if (not lst) or (len(lst) != len(self.__sources)):
+            return False
+        self.setOutputs(lst)
+        return True
+
+    def measureSize(self, parsed):
+        """Measure combined size of all sources for statistics. Unparsed sources are measured by preprocessed content."""
+        # Formatting before renaming would warn about every unlocked name.
+        verbose = is_verbose()
+        set_verbose(False)
+        ret = 0
+        for ii in self.__sources:
+            if parsed:
+                ret += len(ii.format(True))
+            else:
+                ret += len(ii.getPreprocessedContent())
+        set_verbose(verbose)
+        return ret
+
     def mergeCollectedNames(self, lst):
         """Merge all matching names in the list of collected names."""
         # Merge functions with the same name (overrides) and inout blocks.
         ret = []
+        # Only name strips with the same merge key can merge, they are kept in buckets in collection order.
+        buckets = {}
         for ii in lst:
             block = ii.getBlock()
             if is_glsl_block_function(block) or is_glsl_block_inout(block):
+                key = get_merge_key(block)
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = []
+                    buckets[key] = bucket
                 found = False
-                for jj in ret:
+                for jj in bucket:
                     if self.mergeCollectedNamesTest(ii, jj):
                         found = True
                         break
                 # Do not add to array if already merged into it.
                 if found:
                     continue
+                bucket += [ii]
             ret += [ii]
         # Set proper type information for all elements.
         for ii in ret:
@@ -334,35 +734,37 @@ class Glsl:
     def parse(self):
         """Parse all source files."""
         # First, assemble glsl chains.
-        source_dict = {}
-        for ii in self.__sources:
-            if ii.isCommonChainName():
-                continue
-            chain_name = ii.getChainName()
-            if chain_name in source_dict:
-                source_dict[chain_name].addSource(ii)
-            else:
-                source_dict[chain_name] = GlslSourceChain(ii)
-        for ii in self.__sources:
-            if not ii.isCommonChainName():
-                continue
-            for jj in source_dict.keys():
-                source_chain = source_dict[jj]
-                if source_chain.isSourceSlotFree(ii):
-                    source_chain.addSource(ii)
-        self.__chains = source_dict.values()
+        self.assembleChains()
         if is_verbose():
             print("GLSL source chains: %s" % (" ; ".join(map(lambda x: str(x), self.__chains))))
         # Run parse process on sources.
+        self.beginPhase("parse", False)
         for ii in self.__sources:
             ii.parse()
+        self.endPhase()
 
     def read(self, preprocessor, definition_ld, filename, output_name=None, varname=None):
         """Read source file."""
+        self.beginPhase("read", False)
         src = glsl_read_source(preprocessor, definition_ld, filename, output_name, varname)
-        self.__sources += [src]
+        self.addSource(src)
+        self.endPhase(False)
+        stats = get_glsl_stats()
+        if stats:
+            stats.addSource(filename)
 
-    def renameBlockType(self, block):
+    def readSources(self, preprocessor, definition_ld, lst):
+        """Read source files given as listings of filename, output name and variable name, preprocessing in a batch."""
+        self.beginPhase("read", False)
+        for ii in glsl_read_sources(preprocessor, definition_ld, lst):
+            self.addSource(ii)
+        self.endPhase(False)
+        stats = get_glsl_stats()
+        if stats:
+            for ii in lst:
+                stats.addSource(ii[0])
+
+    def renameBlockType(self, block, target_name=None):
         """Rename block type for given name strip."""
         # Select name to rename to.
         if not target_name:
@@ -378,10 +780,12 @@ class Glsl:
         # Listing case.
         if is_listing(block):
             for ii in block:
-                self.renameBlock(ii, target_name)
+                self.renameBlockType(ii, target_name)
             return
         # Just select first name.
         block.getTypeName().lock(target_name)
+        self.__block_type_names.add(target_name)
+        self.countLock([block.getTypeName()], target_name)
 
     def renameMembers(self, block, max_renames):
         """Rename all members in given block."""
@@ -396,8 +800,50 @@ class Glsl:
         for (name_list, letter) in zip(lst[:renames], counted[:renames]):
             for name in name_list:
                 name.lock(letter)
+            self.countLock(name_list, letter)
         return renames
 
+    def renameGraph(self, merged, max_renames):
+        """Rename given name strips at once by colouring their interference graph. Return number of renames."""
+        strips = list(merged)
+        if 0 <= max_renames:
+            strips = strips[:max_renames]
+        (graph, declared_in, global_in) = self.buildInterferenceGraph(strips)
+        # Colours of strips declared within each source, and of strips interfering with each source as a whole.
+        declared_colours = {}
+        global_colours = {}
+        for ii in self.__sources:
+            declared_colours[id(ii)] = set()
+            global_colours[id(ii)] = set()
+        # Most frequent names are coloured first to get the most frequent letters.
+        order = sorted(range(len(strips)), key=lambda x: -strips[x].getNameCount())
+        colours = [None] * len(strips)
+        for ii in order:
+            strip = strips[ii]
+            taken = set(map(lambda x: colours[x], graph[ii]))
+            for jj in declared_in[ii]:
+                taken |= global_colours[jj]
+            for jj in global_in[ii]:
+                taken |= declared_colours[jj]
+            counted = self.countSorted()
+            colour = None
+            # Only locked names remain to be checked for conflicts.
+            for letter in counted:
+                if (not (letter in taken)) and (not self.hasNameConflict(strip, letter)):
+                    colour = letter
+                    break
+            if not colour:
+                colour = self.inventName(strip, counted, taken)
+            colours[ii] = colour
+            for jj in declared_in[ii]:
+                declared_colours[jj].add(colour)
+            for jj in global_in[ii]:
+                global_colours[jj].add(colour)
+            self.countLock(strip.getNameList(), colour)
+        for (strip, colour) in zip(strips, colours):
+            strip.lockNames(colour)
+        return len(strips)
+
     def renamePass(self, op):
         """Perform rename pass for given name strip."""
         block_list = op.getBlockList()
@@ -405,10 +851,12 @@ class Glsl:
         for letter in counted:
             if not self.hasNameConflict(op, letter):
                 op.lockNames(letter)
+                self.countLock(op.getNameList(), letter)
                 return
         # None of the letters was free, invent new one.
         target_name = self.inventName(op, counted)
         op.lockNames(target_name)
+        self.countLock(op.getNameList(), target_name)
 
     def selectSwizzle(self):
         counted = self.count()
@@ -455,6 +903,15 @@ class Glsl:
             print("Selected GLSL swizzle: %s (%i vs. %s)" % (str(ret), selected_for, selected_against))
         return ret
 
+    def setOutputs(self, lst):
+        """Set output of all sources, replacing crunched output."""
+        for (source, output) in zip(self.__sources, lst):
+            source.setOutput(output)
+
+    def storeCache(self, cache, key):
+        """Store output of all sources into cache."""
+        cache.store(key, self.getOutputs())
+
     def write(self):
         """Write processed source headers."""
         for ii in self.__sources:
@@ -468,65 +925,32 @@ class Glsl:
 # Functions ############################
 ########################################
 
-def flatten(block):
-    """Flattens a block and its children to a sequential array."""
-    ret = []
-    for ii in block.getChildren():
-        ret += [ii]
-        ret += flatten(ii)
-    return ret
+def get_merge_key(block):
+    """Get key for merging name strips declared by given block. Only name strips with equal keys may merge."""
+    if is_glsl_block_function(block):
+        return ("function", block.getName().getSymbol())
+    if is_glsl_block_inout_struct(block):
+        return ("struct", block.getTypeName().getSymbol())
+    if is_glsl_block_inout_typed(block):
+        return ("typed", block.getName().getSymbol())
+    raise RuntimeError("don't know how to merge block %s" % (str(block)))
 
-def has_inline_conflict(parent, block, names, comparison=None):
+def has_inline_conflict(def_use, block, names):
     """Tell if given block has inline conflict."""
-    # Iterate over statement names if comparison not present.
-    if not comparison:
-        for ii in block.getStatement().getTokens():
-            if is_glsl_name(ii) and has_inline_conflict(parent, block, names, ii):
-                return True
+    # Blocks outside the parent can not conflict.
+    first = def_use.getPosition(block)
+    if first is None:
         return False
-    # Search for alterations of name.
-    found = False
-    uses = len(names)
-    for ii in flatten(parent):
-        if block == ii:
-            found = True
-        # If name is found used by this particular block, decrement uses. Can stop iteration at 0 uses.
-        for jj in names:
-            if ii.hasUsedNameExact(jj):
-                uses -= 1
-        if 0 >= uses:
-            return False
-        # Assignment into a name used by the statement makes inlining impossible.
-        if found and is_glsl_block_assignment(ii) and ii.getName() == comparison:
-            return True
-    return False
-
-def has_name_conflict(parent, block, name):
-    """Tell if given block contains a conflict for given name."""
-    found = False
-    for ii in flatten(parent):
-        # Declared names take the name out of the scope permanently.
-        if ii.hasLockedDeclaredName(name):
-            return True
-        # Other blocks reserve names from their inception onward.
-        if block == ii:
-            found = True
-        if found and ii.hasLockedUsedName(name):
-            return True
+    # Assignment within the block using up the names happens after the use.
+    last = def_use.getLastUse(names) - 1
+    for ii in block.getStatement().getTokens():
+        if is_glsl_name(ii):
+            glsl_stats_count("conflict_checks")
+            # Assignment into a name used by the statement makes inlining impossible.
+            if def_use.hasDefinition(ii, first, last):
+                return True
     return False
 
-def inline_instances(parent, block, names):
-    """Inline all instances of block in given parent scope."""
-    ret = 0
-    tokens = block.getStatement().getTokens()
-    for ii in flatten(parent):
-        if (ii == block) or (ii.getParent() == block):
-            continue
-        for jj in names:
-            if ii.hasUsedNameExact(jj):
-                ret += ii.replaceUsedNameExact(jj, tokens)
-    return ret
-
 def is_glsl_block_global(op):
     """Tell if block is somehting of a global concern."""
     return (is_glsl_block_inout(op) or is_glsl_block_uniform(op))
@@ -537,11 +961,47 @@ def is_inline_name(op):
         return True
     return False
 
+def is_inline_name_strip(op):
+    """Tell if given name strip can be inlined, assuming no conflicts."""
+    # Merged instances not ok for inlining.
+    if op.getBlockCount() > 1:
+        return False
+    # Must be declaration to be inlined anywhere.
+    if not is_glsl_block_declaration(op.getBlock()):
+        return False
+    # Must be an inline name to be inlined.
+    return is_inline_name(op.getName())
+
+def is_name_taken(name, lst):
+    """Tell if given name is in any of given sets of names."""
+    for ii in lst:
+        if name in ii:
+            return True
+    return False
+
 def is_source_level_name_strip(op):
     """Tell if given name strip exists in source level."""
     blk = op.getBlock()
     return is_glsl_block_source(blk.getParent())
 
+def find_declaring_block(block, name):
+    """Find the block whose declaration of given name is visible from given block."""
+    while True:
+        if block.hasDeclaredName(name):
+            return block
+        parent = block.getParent()
+        if not parent:
+            return None
+        # Nearest preceding sibling declaring the name takes precedence.
+        siblings = parent.getChildren()
+        index = len(siblings) - 1
+        while not (siblings[index] is block):
+            index -= 1
+        for ii in reversed(siblings[:index]):
+            if ii.hasDeclaredName(name):
+                return ii
+        block = parent
+
 def find_parent_scope(block):
     """Find parent scope block for given block."""
     while True:
@@ -559,6 +1019,18 @@ def find_parent_scope(block):
             return parent
         block = parent
 
+def glsl_crunch_group(task):
+    """Crunch a group of parsed sources in a database of its own. Return the crunched sources, operation counts and statistics."""
+    (sources, mode, max_inlines, max_renames, max_simplifys, renamer, verbose, stats) = task
+    set_verbose(verbose)
+    set_glsl_stats(stats)
+    ret = Glsl()
+    for ii in sources:
+        ret.addSource(ii)
+    ret.assembleChains()
+    ret.crunch(mode, max_inlines, max_renames, max_simplifys, 1, renamer)
+    return (ret.getSources(), ret.getOperationCounts(), stats)
+
 def single_character_alphabet():
     """Returns an alphabet of single characters, lower and upper case."""
     ret = []
@@ -571,7 +1043,7 @@ def single_character_alphabet():
 def simplify_pass(block, max_simplifys):
     """Run simplify pass starting from given root block."""
     ret = 0
-    for ii in flatten(block):
+    for ii in block.iteratePreorder():
         if (max_simplifys >= 0) and (ret >= max_simplifys):
             break
         ret += ii.simplify(max_simplifys - ret)
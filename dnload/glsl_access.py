@@ -10,6 +10,8 @@ from dnload.glsl_paren import is_glsl_paren
 class GlslAccess:
     """Swizzle operator."""
 
+    __slots__ = ("__access", "__name", "__source", "__swizzle", "__swizzle_export")
+
     def __init__(self, name):
         """Constructor."""
         self.__name = name
@@ -17,6 +19,16 @@ class GlslAccess:
         self.__access = None
         self.interpretSwizzle()
 
+    def clone(self):
+        """Create a copy for use in another location. Source and access must be relinked afterwards."""
+        ret = GlslAccess.__new__(GlslAccess)
+        ret.__name = self.__name.clone()
+        ret.__source = self.__source
+        ret.__access = self.__access
+        ret.__swizzle = self.__swizzle
+        ret.__swizzle_export = self.__swizzle_export
+        return ret
+
     def disableSwizzle(self):
         """Explicitly disable swizzle."""
         self.__swizzle = None
@@ -92,6 +104,14 @@ class GlslAccess:
         if 4 < len(self.__swizzle):
             self.__swizzle = None
 
+    def relink(self, clones):
+        """Point source and access to their clones, given a dict of clones by id of the original."""
+        self.__name.relink(clones)
+        if self.__source:
+            self.__source = clones.get(id(self.__source), self.__source)
+        if self.__access:
+            self.__access = clones.get(id(self.__access), self.__access)
+
     def selectSwizzle(self, op):
         """Select swizzle mode  for exporting."""
         if op not in (("r", "g", "b", "a"), ("s", "t", "p", "q"), ("x", "y", "z", "w")):
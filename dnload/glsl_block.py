@@ -1,28 +1,38 @@
 import re
 
 from dnload.common import is_listing
+from dnload.glsl_access import GlslAccess
 from dnload.glsl_access import interpret_access
 from dnload.glsl_access import is_glsl_access
 from dnload.glsl_control import interpret_control
 from dnload.glsl_control import is_glsl_control
+from dnload.glsl_control import g_control
 from dnload.glsl_int import interpret_int
 from dnload.glsl_int import is_glsl_int
 from dnload.glsl_int import is_glsl_int_unsigned
+from dnload.glsl_int import match_int
 from dnload.glsl_inout import interpret_inout
 from dnload.glsl_inout import is_glsl_inout
+from dnload.glsl_inout import g_inout
 from dnload.glsl_float import interpret_float
 from dnload.glsl_float import is_glsl_float
-from dnload.glsl_name import interpret_name
+from dnload.glsl_name import GlslName
 from dnload.glsl_name import is_glsl_name
+from dnload.glsl_name import match_name
 from dnload.glsl_name_strip import GlslNameStrip
 from dnload.glsl_operator import interpret_operator
 from dnload.glsl_operator import is_glsl_operator
+from dnload.glsl_operator import g_operators
 from dnload.glsl_paren import interpret_paren
 from dnload.glsl_paren import is_glsl_paren
+from dnload.glsl_stats import glsl_stats_count
 from dnload.glsl_terminator import interpret_terminator
 from dnload.glsl_terminator import is_glsl_terminator
+from dnload.glsl_token_cursor import glsl_token_cursor
 from dnload.glsl_type import interpret_type
 from dnload.glsl_type import is_glsl_type
+from dnload.glsl_type import match_type_id
+from dnload.glsl_type import g_type_modifiers
 
 ########################################
 # GlslBlock ############################
@@ -31,13 +41,18 @@ from dnload.glsl_type import is_glsl_type
 class GlslBlock:
     """GLSL block - represents one scope with sub-scopes, function, file, etc."""
 
+    __slots__ = ("__accesses", "__flattened", "__flattened_version", "__names_declared", "__names_used", "__parent", "__version", "_children")
+
     def __init__(self):
         """Constructor."""
         self._children = []
         self.__accesses = []
+        self.__flattened = None
+        self.__flattened_version = None
         self.__names_declared = set()
         self.__names_used = []
         self.__parent = None
+        self.__version = 0
 
     def addAccesses(self, op):
         if is_listing(op):
@@ -63,6 +78,7 @@ class GlslBlock:
             else:
                 self._children += [ii]
             ii.setParent(self)
+        self.bumpVersion()
 
     def addNamesDeclared(self, op):
         """Add given names as names declared by this block."""
@@ -86,6 +102,13 @@ class GlslBlock:
             return
         self.__names_used += [op]
 
+    def bumpVersion(self):
+        """Mark the hierarchy of this and all parents as modified."""
+        block = self
+        while block:
+            block.__version += 1
+            block = block.__parent
+
     def clearAccesses(self):
         """Clear accesses."""
         self.__accesses = []
@@ -104,67 +127,66 @@ class GlslBlock:
 
     def collapseRecursive(self, mode):
         """Collapse collapsable elements."""
-        ret = 0
-        while True:
-            if not self.collapseContents(mode):
-                break
-        while True:
-            if not self.collapseRun(mode):
-                break
-            ret += 1
+        self.collapseContents(mode)
+        ret = self.collapseRun(mode)
         for ii in self._children:
             ret += ii.collapseRecursive(mode)
         return ret
 
     def collapseRun(self, mode):
-        """Perform one collapse run. Return true if collapse was made."""
-        for ii in range(len(self._children) - 1):
-            vv = self._children[ii]
-            ww = self._children[ii + 1]
-            if vv.collapse(ww, mode):
-                self._children.pop(ii + 1)
-                return True
-        return False
+        """Collapse adjacent children in one sweep. Return number of collapses made."""
+        # Collapsing does not change whether preceding children collapse, so a single sweep reaches the fixed point.
+        ret = 0
+        lst = []
+        for ii in self._children:
+            if lst and lst[-1].collapse(ii, mode):
+                ret += 1
+                continue
+            lst += [ii]
+        if ret:
+            self._children = lst
+            self.bumpVersion()
+        return ret
 
-    def collect(self):
-        """Collect all uses of identifiers."""
+    def collect(self, visible=None):
+        """Collect all uses of identifiers in one pass. Return name strips of names declared within this.
+        Name strips declared outside can be made visible with a dict of name strip listings by symbol."""
         ret = []
-        for ii in range(len(self._children)):
-            vv = self._children[ii]
-            for name in vv.getDeclaredNames():
-                if name.isLocked():
-                    continue
-                name_strip = GlslNameStrip(vv, name)
-                vv.collectRecursive(name_strip)
-                for jj in range(ii + 1, len(self._children)):
-                    ww = self._children[jj]
-                    if ww.collectAppend(name_strip):
-                        break
-                ret += [name_strip]
-            ret += vv.collect()
+        self.collectScoped([dict(visible or {})], ret)
         return ret
 
-    def collectAppend(self, op):
-        """Append into an existing name strip."""
-        # Break if the name is declared, instruct upper level to break also.
-        if self.hasDeclaredName(op.getName()):
-            return True
-        self.collectRecursive(op)
-        return False
-
-    def collectRecursive(self, op):
-        """Recursively collect all further uses of given."""
-        self.collectUsed(op)
-        for ii in self._children:
-            if ii.hasDeclaredName(op.getName()):
-                return
-            ii.collectRecursive(op)
-
-    def collectUsed(self, op):
-        """Collect all further uses into given name strip."""
+    def collectScoped(self, scopes, ret):
+        """Collect names of this and children into name strips visible in given scopes, innermost last.
+        Declared names are visible to this, its children and its later siblings, so they go into the innermost scope."""
+        scope = scopes[-1]
+        for ii in self.__names_declared:
+            symbol = ii.getSymbol()
+            # Names locked into another name do not hide the name they were declared with.
+            if ii.getOriginalSymbol() != symbol:
+                continue
+            if ii.isLocked():
+                scope[symbol] = []
+                continue
+            name_strip = GlslNameStrip(self, ii)
+            scope[symbol] = [name_strip]
+            ret += [name_strip]
         for ii in self.__names_used:
-            if ii == op.getName():
-                op.addName(ii)
+            symbol = ii.getSymbol()
+            for jj in reversed(scopes):
+                if symbol in jj:
+                    for kk in jj[symbol]:
+                        kk.addName(ii)
+                    break
+        if self._children:
+            scopes += [{}]
+            for ii in self._children:
+                ii.collectScoped(scopes, ret)
+            scopes.pop()
+
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink. Default implementation appends formatted output.
+        Blocks containing other blocks emit them into the same sink so the tree is formatted in one traversal."""
+        sink.append(self.format(force))
 
     def expand(self):
         """Default implementation of expand, returns node itself."""
@@ -172,23 +194,36 @@ class GlslBlock:
 
     def expandRecursive(self):
         """Expand all expandable children."""
-        while True:
-            if not self.expandRun():
-                break
+        self.expandRun()
         for ii in self._children:
             ii.expandRecursive()
 
     def expandRun(self):
-        """Perform one child expansion run. Return true if expansion was made."""
-        for ii in range(len(self._children)):
-            array = self._children[ii].expand()
+        """Expand children in one sweep. Return true if expansion was made."""
+        ret = False
+        lst = []
+        # Expanded blocks are expanded again in place until they no longer expand.
+        pending = list(reversed(self._children))
+        while pending:
+            block = pending.pop()
+            array = block.expand()
             if 1 < len(array):
-                self._children.pop(ii)
-                self._children[ii:ii] = array
-                for jj in array:
-                    jj.setParent(self)
-                return True
-        return False
+                pending += reversed(array)
+                ret = True
+                continue
+            lst += [block]
+        if ret:
+            self._children = lst
+            for ii in lst:
+                ii.__parent = self
+            self.bumpVersion()
+        return ret
+
+    def format(self, force):
+        """Return formatted output. Default implementation joins emitted fragments."""
+        sink = []
+        self.emit(sink, force)
+        return "".join(sink)
 
     def getChildren(self):
         """Accessor."""
@@ -198,6 +233,15 @@ class GlslBlock:
         """Accessor."""
         return self.__names_declared
 
+    def getFlattened(self):
+        """Get all blocks below this in preorder. Cached until the hierarchy is modified."""
+        glsl_stats_count("flatten_calls")
+        if self.__flattened_version != self.__version:
+            glsl_stats_count("flatten_rebuilds")
+            self.__flattened = list(self.iteratePreorder())
+            self.__flattened_version = self.__version
+        return self.__flattened
+
     def getParent(self):
         """Accessor."""
         return self.__parent
@@ -215,6 +259,10 @@ class GlslBlock:
         """Accessor."""
         return self.__names_used
 
+    def getVersion(self):
+        """Accessor."""
+        return self.__version
+
     def hasChild(self, op):
         """Tell if list of children contains given child."""
         return (op in self._children)
@@ -248,11 +296,29 @@ class GlslBlock:
                 return True
         return False
 
+    def iteratePreorder(self):
+        """Iterate over all blocks below this in preorder without building a list."""
+        stack = [iter(self._children)]
+        visited = 0
+        try:
+            while stack:
+                block = next(stack[-1], None)
+                if block is None:
+                    stack.pop()
+                    continue
+                visited += 1
+                yield block
+                stack += [iter(block.getChildren())]
+        finally:
+            # Iteration may be abandoned halfway, count only blocks actually visited.
+            glsl_stats_count("nodes_visited", visited)
+
     def removeChild(self, op):
         """Remove a child block."""
         for ii in range(len(self._children)):
             if self._children[ii] == op:
                 self._children.pop(ii)
+                self.bumpVersion()
                 return
         raise RuntimeError("could not find child to remove")
 
@@ -263,6 +329,7 @@ class GlslBlock:
         self._children[index].setParent(None)
         self._children[index] = child
         child.setParent(self)
+        self.bumpVersion()
 
     def removeFromParent(self):
         """Remove this from its parent."""
@@ -279,7 +346,8 @@ class GlslBlock:
                     if (not typeid.isVectorType()) and (ii.getSwizzleLength() == 1):
                         print("WARNING: redundant or invalid access %s on type %s" % (str(ii), str(typeid)))
                     ii.selectSwizzle(op)
-                else:
+                # Accesses into inout struct instances are member accesses, not swizzles.
+                elif not is_glsl_name(typeid):
                     print("WARNING: access %s has invalid source type %s" % (str(ii), str(typeid)))
             else:
                 print("WARNING: source %s of access %s has no type" % (str(ii.getSource()), str(ii)))
@@ -297,6 +365,14 @@ class GlslBlock:
             raise RuntimeError("GlslBlock::setParent() hierarchy inconsistency")
         self.__parent = op
 
+########################################
+# Globals ##############################
+########################################
+
+g_token_interpreters = {}
+
+g_lexer = re.compile(r'(?P<newline>\n)|(?P<space>[^\S\n]+)|(?P<special>\+\+|--|&&|\^\^|\|\||[\+\-\*\/<>\=!]\=|[\(\)\[\]\{\}\+\-\*\/%\|&\^!\.,;:<>\=])|(?P<word>[^\s\(\)\[\]\{\}\+\-\*\/%\|&\^!\.,;:<>\=]+)')
+
 ########################################
 # Functions ############################
 ########################################
@@ -321,17 +397,22 @@ def extract_scope(tokens, opener):
     if not is_glsl_paren(opener):
         raise RuntimeError("no opener passed to scope extraction")
     paren_count = 1
-    ret = []
     for ii in range(len(tokens)):
         elem = tokens[ii]
         if is_glsl_paren(elem):
             paren_count = opener.update(elem, paren_count)
             if 0 >= paren_count:
-                return (ret, tokens[ii + 1:])
-        ret += [elem]
+                return (tokens[:ii], tokens[ii + 1:])
     # Did not find closing scope element.
     return (None, tokens)
 
+def emitted_head(sink, start):
+    """Get first character emitted into given sink from given position onwards, empty if nothing emitted."""
+    for ii in range(start, len(sink)):
+        if sink[ii]:
+            return sink[ii][:1]
+    return ""
+
 def extract_tokens(tokens, required):
     """Require tokens from token string, return selected elements and the rest of tokens."""
     # If required is just a string, make it a listing of length one.
@@ -346,14 +427,14 @@ def extract_tokens(tokens, required):
     # For straight-out incompatible request, get out immediately.
     if len(required) > len(tokens):
         return failure_array
-    # Iterate over requests.
-    content = tokens[:]
-    required = list(required)
+    # Iterate over requests. Advancing the cursor does not copy tokens, input is returned as-is on failure.
+    content = glsl_token_cursor(tokens)
     ret = []
-    success = True
-    while content and required:
-        curr = content.pop(0)
-        req = required.pop(0)
+    for req in required:
+        if not content:
+            break
+        curr = content[0]
+        content = content[1:]
         # Token request.
         if "?" == req[:1]:
             desc = req[1:]
@@ -385,124 +466,165 @@ def is_glsl_block(op):
 
 def tokenize(source):
     """Split statement into tokens."""
-    return tokenize_interpret(tokenize_split(source))
+    return tokenize_interpret(tokenize_lex(source))
 
-def tokenize_interpret(tokens):
-    """Interpret a list of preliminary tokens, assembling constructs from them."""
+def tokenize_classify(lexeme):
+    """Find interpreter for given lexeme and store it into the table of known lexemes."""
+    ret = g_token_interpreters.get(lexeme)
+    if ret:
+        return ret
+    # Fill keywords on first use.
+    if not g_token_interpreters:
+        for ii in ("(", "[", "{", ")", "]", "}"):
+            g_token_interpreters[ii] = tokenize_interpret_paren
+        for ii in g_control:
+            g_token_interpreters[ii] = tokenize_interpret_control
+        for ii in g_inout:
+            g_token_interpreters[ii] = tokenize_interpret_inout
+        for ii in g_type_modifiers:
+            g_token_interpreters[ii] = tokenize_interpret_modifier
+        for ii in g_operators:
+            g_token_interpreters[ii] = tokenize_interpret_operator
+        # Operators of two characters are lexed as one.
+        for ii in ("++", "--", "&&", "^^", "||", "+=", "-=", "*=", "/=", "<=", ">=", "==", "!="):
+            g_token_interpreters[ii] = tokenize_interpret_operator
+        g_token_interpreters["."] = tokenize_interpret_period
+        g_token_interpreters[";"] = tokenize_interpret_terminator
+        if lexeme in g_token_interpreters:
+            return g_token_interpreters[lexeme]
+    # Only types, numbers and names need to be matched.
+    if match_type_id(lexeme):
+        ret = tokenize_interpret_type
+    elif match_int(lexeme):
+        ret = tokenize_interpret_number
+    elif match_name(lexeme):
+        ret = tokenize_interpret_name
+    else:
+        ret = tokenize_interpret_unknown
+    g_token_interpreters[lexeme] = ret
+    return ret
+
+def tokenize_interpret(lexemes):
+    """Interpret preliminary tokens from the lexer, assembling constructs from them."""
+    lexemes = list(lexemes)
+    tokens = [x[0] for x in lexemes]
     ret = []
     ii = 0
     while len(tokens) > ii:
         element = tokens[ii]
-        # Try paren.
-        paren = interpret_paren(element)
-        if paren:
-            ret += [paren]
-            ii += 1
+        interpreter = g_token_interpreters.get(element)
+        if not interpreter:
+            interpreter = tokenize_classify(element)
+        consumed = interpreter(tokens, ii, ret)
+        if consumed:
+            ii += consumed
             continue
-        # Try 2-stage control.
-        if (ii + 1) < len(tokens):
-            control = interpret_control(element, tokens[ii + 1])
-            if control:
-                ret += [control]
-                ii += 2
-                continue
-        # Try control.
-        control = interpret_control(element)
+        # Fallback is to add token as-is.
+        print("WARNING: GLSL: unknown element '%s' at line %i, column %i" % (element, lexemes[ii][1], lexemes[ii][2]))
+        ret += [element]
+        ii += 1
+    return ret
+
+def tokenize_interpret_control(tokens, ii, ret):
+    """Interpret control, possibly 2-stage. Return number of tokens consumed."""
+    if (ii + 1) < len(tokens):
+        control = interpret_control(tokens[ii], tokens[ii + 1])
         if control:
             ret += [control]
-            ii += 1
-            continue
-        # Try in/out.
-        inout = interpret_inout(element)
-        if inout:
-            ret += [inout]
-            ii += 1
-            continue
-        # Try 2-stage type.
-        if (ii + 1) < len(tokens):
-            typeid = interpret_type(element, tokens[ii + 1])
-            if typeid:
-                ret += [typeid]
-                ii += 2
-                continue
-        # Try type.
-        typeid = interpret_type(element)
+            return 2
+    ret += [interpret_control(tokens[ii])]
+    return 1
+
+def tokenize_interpret_inout(tokens, ii, ret):
+    """Interpret in/out. Return number of tokens consumed."""
+    ret += [interpret_inout(tokens[ii])]
+    return 1
+
+def tokenize_interpret_modifier(tokens, ii, ret):
+    """Interpret 2-stage type, or name if not followed by a type. Return number of tokens consumed."""
+    if (ii + 1) < len(tokens):
+        typeid = interpret_type(tokens[ii], tokens[ii + 1])
         if typeid:
             ret += [typeid]
-            ii += 1
-            continue
-        # Period may signify truncated floating point or member/swizzle access.
-        if "." == tokens[ii] and (ii + 1) < len(tokens):
-            decimal = interpret_int(tokens[ii + 1])
+            return 2
+    return tokenize_interpret_name(tokens, ii, ret)
+
+def tokenize_interpret_name(tokens, ii, ret):
+    """Interpret name identifier. Return number of tokens consumed."""
+    ret += [GlslName(tokens[ii])]
+    return 1
+
+def tokenize_interpret_number(tokens, ii, ret):
+    """Interpret integer or floating point number. Return number of tokens consumed."""
+    number = interpret_int(tokens[ii])
+    if (ii + 1) < len(tokens) and "." == tokens[ii + 1]:
+        if ((ii + 2) < len(tokens)) and (tokenize_classify(tokens[ii + 2]) is tokenize_interpret_number):
+            decimal = interpret_int(tokens[ii + 2])
             if decimal:
-                ret += [interpret_float(0, decimal)]
-                ii += 2
-                continue
+                ret += [interpret_float(number, decimal)]
+                return 3
+        ret += [interpret_float(number, 0)]
+        return 2
+    ret += [number]
+    return 1
+
+def tokenize_interpret_operator(tokens, ii, ret):
+    """Interpret operator of up to two special characters lexed together. Return number of tokens consumed."""
+    operator = interpret_operator(tokens[ii][0])
+    for jj in tokens[ii][1:]:
+        if not operator.incorporate(interpret_operator(jj)):
+            raise RuntimeError("could not interpret operator '%s'" % (tokens[ii]))
+    ret += [operator]
+    return 1
+
+def tokenize_interpret_paren(tokens, ii, ret):
+    """Interpret paren. Return number of tokens consumed."""
+    ret += [interpret_paren(tokens[ii])]
+    return 1
+
+def tokenize_interpret_period(tokens, ii, ret):
+    """Interpret truncated floating point or member/swizzle access. Return number of tokens consumed."""
+    if (ii + 1) < len(tokens):
+        interpreter = tokenize_classify(tokens[ii + 1])
+        if interpreter is tokenize_interpret_number:
+            ret += [interpret_float(0, interpret_int(tokens[ii + 1]))]
+            return 2
+        # Keywords are valid member names too.
+        if interpreter is tokenize_interpret_name:
+            access = GlslAccess(GlslName(tokens[ii + 1]))
+        else:
             access = interpret_access(tokens[ii + 1])
-            if access:
-                access.setSource(ret)
-                ret += [access]
-                ii += 2
-                continue
-        # Number may be just an integer or floating point.
-        number = interpret_int(element)
-        if number:
-            if (ii + 1) < len(tokens) and "." == tokens[ii + 1]:
-                if (ii + 2) < len(tokens):
-                    decimal = interpret_int(tokens[ii + 2])
-                    if decimal:
-                        ret += [interpret_float(number, decimal)]
-                        ii += 3
-                        continue
-                ret += [interpret_float(number, 0)]
-                ii += 2
-                continue
-            ret += [number]
-            ii += 1
-            continue
-        # Special characters may be operators, up to two in a row.
-        operator = interpret_operator(element)
-        if operator:
-            if (ii + 1) < len(tokens):
-                extended_operator = interpret_operator(tokens[ii + 1])
-                if extended_operator and operator.incorporate(extended_operator):
-                    ret += [operator]
-                    ii += 2
-                    continue
-            ret += [operator]
-            ii += 1
-            continue
-        # Statement terminator.
-        terminator = interpret_terminator(element)
-        if terminator:
-            ret += [terminator]
-            ii += 1
-            continue
-        # Try name identifier last.
-        name = interpret_name(element)
-        if name:
-            ret += [name]
-            ii += 1
-            continue
-        # Fallback is to add token as-is.
-        print("WARNING: GLSL: unknown element '%s'" % element)
-        ret += [element]
-        ii += 1
-    return ret
-
-def tokenize_split(source):
-    if not source:
-        return []
-    ret = []
-    array = source.split()
-    if 1 < len(array):
-        for ii in array:
-            ret += tokenize_split(ii)
-        return ret
-    array = re.split(r'([\(\)\[\]\{\}\+\-\*\/%\|&\^!\.,;:<>\=])', source, 1)
-    if 3 > len(array):
-        return [source]
-    return list(filter(lambda x: x, array[:2])) + tokenize_split(array[2])
+        if access:
+            access.setSource(ret)
+            ret += [access]
+            return 2
+    return 0
+
+def tokenize_interpret_terminator(tokens, ii, ret):
+    """Interpret statement terminator. Return number of tokens consumed."""
+    ret += [interpret_terminator(tokens[ii])]
+    return 1
+
+def tokenize_interpret_type(tokens, ii, ret):
+    """Interpret type. Return number of tokens consumed."""
+    ret += [interpret_type(tokens[ii])]
+    return 1
+
+def tokenize_interpret_unknown(tokens, ii, ret):
+    """Unknown elements are not interpreted."""
+    return 0
+
+def tokenize_lex(source):
+    """Split source into preliminary tokens in one scan. Yields tokens with their line and column."""
+    line = 1
+    line_start = 0
+    for ii in g_lexer.finditer(source):
+        kind = ii.lastgroup
+        if "newline" == kind:
+            line += 1
+            line_start = ii.end()
+        elif "space" != kind:
+            yield (ii.group(kind), line, ii.start() - line_start + 1)
 
 def validate_token(token, validation):
     """Validate that token matches given requirement."""
@@ -9,6 +9,8 @@ from dnload.glsl_block_statement import glsl_parse_statement
 class GlslBlockArray(GlslBlock):
     """Array literal block."""
 
+    __slots__ = ("__terminator", "__typeid")
+
     def __init__(self, typeid, children, terminator):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -19,10 +21,12 @@ class GlslBlockArray(GlslBlock):
             raise RuntimeError("array literal must have children")
         self.addChildren(children)
 
-    def format(self, force):
-        """Return formatted output."""
-        statements = "".join(map(lambda x: x.format(force), self._children))
-        return "%s[](%s)%s" % (self.__typeid.format(force), statements, self.__terminator.format(force))
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
+        sink.append("%s[](" % (self.__typeid.format(force)))
+        for ii in self._children:
+            ii.emit(sink, force)
+        sink.append(")%s" % (self.__terminator.format(force)))
 
     def getTerminator(self):
         """Accessor."""
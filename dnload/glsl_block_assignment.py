@@ -12,6 +12,8 @@ from dnload.glsl_paren import GlslParen
 class GlslBlockAssignment(GlslBlock):
     """Assignment block."""
 
+    __slots__ = ("__assign", "__modifiers", "__name", "__terminator")
+
     def __init__(self, name, lst, assign, children, terminator):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -28,18 +30,22 @@ class GlslBlockAssignment(GlslBlock):
         if children:
             self.addChildren(children)
 
-    def format(self, force):
-        """Return formatted output."""
-        ret = self.__name.format(force)
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
+        sink.append(self.__name.format(force))
         if self.__modifiers:
-            ret += "".join(map(lambda x: x.format(force), self.__modifiers))
-        statements = "".join(map(lambda x: x.format(force), self._children))
+            sink.extend(map(lambda x: x.format(force), self.__modifiers))
         if self.__assign:
+            sink.append(self.__assign.format(force))
             # Having an explicit terminator means there was a listing scope.
             if self.__terminator:
-                return ret + ("%s{%s}%s" % (self.__assign.format(force), statements, self.__terminator.format(force)))
-            return ret + ("%s%s" % (self.__assign.format(force), statements))
-        return ret + statements
+                sink.append("{")
+                for ii in self._children:
+                    ii.emit(sink, force)
+                sink.append("}%s" % (self.__terminator.format(force)))
+                return
+        for ii in self._children:
+            ii.emit(sink, force)
 
     def getName(self):
         """Accessor."""
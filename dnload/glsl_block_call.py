@@ -9,6 +9,8 @@ from dnload.glsl_block_statement import glsl_parse_statements
 class GlslBlockCall(GlslBlock):
     """Function call."""
 
+    __slots__ = ("__name", "__terminator")
+
     def __init__(self, name, lst, terminator):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -18,10 +20,12 @@ class GlslBlockCall(GlslBlock):
         self.addNamesUsed(name)
         self.addChildren(lst)
 
-    def format(self, force):
-        """Return formatted output."""
-        lst = "".join(map(lambda x: x.format(force), self._children))
-        return "%s(%s)%s" % (self.__name.format(force), lst, self.__terminator.format(force))
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
+        sink.append("%s(" % (self.__name.format(force)))
+        for ii in self._children:
+            ii.emit(sink, force)
+        sink.append(")%s" % (self.__terminator.format(force)))
 
     def replaceTerminator(self, op):
         """Replace terminator with given element."""
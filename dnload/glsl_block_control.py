@@ -1,5 +1,6 @@
 from dnload.common import is_listing
 from dnload.glsl_block import GlslBlock
+from dnload.glsl_block import emitted_head
 from dnload.glsl_block import extract_tokens
 from dnload.glsl_block_declaration import glsl_parse_declaration
 from dnload.glsl_block_statement import glsl_parse_statements
@@ -11,6 +12,8 @@ from dnload.glsl_block_statement import glsl_parse_statements
 class GlslBlockControl(GlslBlock):
     """Control block."""
 
+    __slots__ = ("__control", "__declaration", "__statements", "__target")
+
     def __init__(self, control, declaration, lst):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -24,24 +27,27 @@ class GlslBlockControl(GlslBlock):
         if lst:
             self.addChildren(lst)
 
-    def format(self, force):
-        """Return formatted output."""
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
         if not self.__target:
             raise RuntimeError("control block '%s' has no target" % (str(self)))
-        target = self.__target.format(force)
-        ret = self.__control.format(force)
+        sink.append(self.__control.format(force))
         # Simple case.
         if self.__control.format(False) == "else":
             if self.__declaration or self.__statements:
                 raise RuntimeError("'%s' should not have declaration or content" % (str(self.__control)))
-            if target[:1].isalnum():
-                return ret + " " + target
-            return ret + target
+            start = len(sink)
+            self.__target.emit(sink, force)
+            if emitted_head(sink, start).isalnum():
+                sink.insert(start, " ")
+            return
         # Add declaration and/or content.
-        ret += "("
+        sink.append("(")
         if self.__declaration:
-            ret += self.__declaration.format(force)
-        return ret + ("%s)%s" % ("".join(map(lambda x: x.format(force), self.__statements)), target))
+            self.__declaration.emit(sink, force)
+        sink.extend(map(lambda x: x.format(force), self.__statements))
+        sink.append(")")
+        self.__target.emit(sink, force)
 
     def getTarget(self):
         """Accessor."""
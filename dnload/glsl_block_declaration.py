@@ -10,6 +10,8 @@ import re
 class GlslBlockDeclaration(GlslBlock):
     """Variable declaration block."""
 
+    __slots__ = ("__typeid",)
+
     def __init__(self, typeid, lst):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -21,10 +23,6 @@ class GlslBlockDeclaration(GlslBlock):
             self.addNamesDeclared(name)
         self.addChildren(lst)
 
-    def format(self, force):
-        """Return formatted output."""
-        return "%s %s" % (self.__typeid.format(force), "".join(map(lambda x: x.format(force), self._children)))
-
     def collapse(self, other, mode):
         """Collapse another declaration."""
         if is_glsl_block_declaration(other) and (other.getType() == self.__typeid):
@@ -38,6 +36,12 @@ class GlslBlockDeclaration(GlslBlock):
             return True
         return False
 
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
+        sink.append("%s " % (self.__typeid.format(force)))
+        for ii in self._children:
+            ii.emit(sink, force)
+
     def expand(self):
         """Expand into multiple declarations."""
         # Do not expand single declarations.
@@ -7,6 +7,8 @@ from dnload.glsl_block import GlslBlock
 class GlslBlockDefault(GlslBlock):
     """Default 'fallback' GLSL block."""
 
+    __slots__ = ("__content",)
+
     def __init__(self, content):
         """Constructor."""
         GlslBlock.__init__(self)
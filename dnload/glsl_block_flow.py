@@ -9,17 +9,19 @@ from dnload.glsl_block_statement import glsl_parse_statement
 class GlslBlockFlow(GlslBlock):
     """Flow control statement."""
 
+    __slots__ = ()
+
     def __init__(self, statement):
         """Constructor."""
         GlslBlock.__init__(self)
         # Hierarchy.
         self.addChildren(statement)
 
-    def format(self, force):
-        """Return formatted output."""
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
         if len(self._children) != 1:
-            raise RuntimeError("GlslBlockFlow::format(), length of children != 1")
-        return "".join(map(lambda x: x.format(force), self._children))
+            raise RuntimeError("GlslBlockFlow::emit(), length of children != 1")
+        self._children[0].emit(sink, force)
 
 ########################################
 # Functions ############################
@@ -11,6 +11,8 @@ from dnload.glsl_block_scope import glsl_parse_scope
 class GlslBlockFunction(GlslBlock):
     """Function block."""
 
+    __slots__ = ("__name", "__parameters", "__scope", "__typeid")
+
     def __init__(self, typeid, name, lst, scope):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -27,12 +29,13 @@ class GlslBlockFunction(GlslBlock):
         self.addChildren(lst)
         self.addChildren(scope)
 
-    def format(self, force):
-        """Return formatted output."""
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
         lst = ""
         if 0 < len(self.__parameters):
             lst = ",".join(map(lambda x: x.format(force), self.__parameters))
-        return "%s %s(%s)%s" % (self.__typeid.format(force), self.__name.format(force), lst, self.__scope.format(force))
+        sink.append("%s %s(%s)" % (self.__typeid.format(force), self.__name.format(force), lst))
+        self.__scope.emit(sink, force)
 
     def getName(self):
         """Accessor."""
@@ -7,6 +7,8 @@ from dnload.glsl_block import GlslBlock
 class GlslBlockGroup(GlslBlock):
     """Group of other blocks. Not parsed, but combined."""
 
+    __slots__ = ()
+
     def __init__(self, block):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -15,9 +17,10 @@ class GlslBlockGroup(GlslBlock):
             block.removeFromParent()
         self.addChildren(block)
 
-    def format(self, force):
-        """Return formatted output."""
-        return "".join(map(lambda x: x.format(force), self._children))
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
+        for ii in self._children:
+            ii.emit(sink, force)
 
 ########################################
 # Functions ############################
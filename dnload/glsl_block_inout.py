@@ -10,6 +10,8 @@ from dnload.glsl_block_member import glsl_parse_member_list
 class GlslBlockInOut(GlslBlock):
     """Input (attribute / varying) declaration block."""
 
+    __slots__ = ("_inout", "_layout")
+
     def __init__(self, layout, inout):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -38,6 +40,8 @@ class GlslBlockInOut(GlslBlock):
 class GlslBlockInOutStruct(GlslBlockInOut):
     """Input (attribute / varying) struct declaration block."""
 
+    __slots__ = ("__member_accesses", "__members", "__name", "__size", "__type_name")
+
     def __init__(self, layout, inout, type_name, members, name, size=0):
         """Constructor."""
         GlslBlockInOut.__init__(self, layout, inout)
@@ -106,6 +110,8 @@ class GlslBlockInOutStruct(GlslBlockInOut):
 class GlslBlockInOutTyped(GlslBlockInOut):
     """Input (attribute / varying) struct declaration block."""
 
+    __slots__ = ("__name", "__typeid")
+
     def __init__(self, layout, inout, typeid, name):
         """Constructor."""
         GlslBlockInOut.__init__(self, layout, inout)
@@ -9,6 +9,8 @@ from dnload.glsl_name import get_list_primitives
 class GlslBlockLayout(GlslBlock):
     """Uniform declaration."""
 
+    __slots__ = ("__elements",)
+
     def __init__(self, elements):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -1,4 +1,3 @@
-from dnload.common import is_listing
 from dnload.glsl_block import GlslBlock
 from dnload.glsl_block import extract_tokens
 
@@ -9,6 +8,8 @@ from dnload.glsl_block import extract_tokens
 class GlslBlockMember(GlslBlock):
     """Member block."""
 
+    __slots__ = ("__name", "__typeid")
+
     def __init__(self, typeid, name):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -56,7 +57,7 @@ def glsl_parse_member(source):
 def glsl_parse_member_list(source):
     """Parse list of members."""
     # Empty member list is ok.
-    if is_listing(source) and (0 >= len(source)):
+    if 0 >= len(source):
         return []
     (member, content) = glsl_parse_member(source)
     if not member:
@@ -1,4 +1,3 @@
-from dnload.common import is_listing
 from dnload.glsl_block import GlslBlock
 from dnload.glsl_block import extract_tokens
 from dnload.glsl_block_assignment import glsl_parse_assignment
@@ -11,6 +10,8 @@ from dnload.glsl_paren import is_glsl_paren
 class GlslBlockParameter(GlslBlock):
     """Parameter block."""
 
+    __slots__ = ("__assignment", "__inout", "__typeid")
+
     def __init__(self, inout, typeid, assignment):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -79,7 +80,7 @@ def glsl_split_parameter_list(source):
 def glsl_parse_parameter_list(source):
     """Parse list of parameters."""
     # Empty parameter list is ok.
-    if is_listing(source) and (0 >= len(source)):
+    if 0 >= len(source):
         return []
     ret = []
     parameters = glsl_split_parameter_list(source)
@@ -8,6 +8,8 @@ from dnload.glsl_block import extract_tokens
 class GlslBlockPerVertex(GlslBlock):
     """gl_PerVertex block."""
 
+    __slots__ = ("__inout", "__scope")
+
     def __init__(self, inout, lst):
         """Constructor."""
         GlslBlock.__init__(self)
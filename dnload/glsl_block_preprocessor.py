@@ -9,6 +9,8 @@ from dnload.glsl_block import GlslBlock
 class GlslBlockPreprocessor(GlslBlock):
     """Preprocessor block."""
 
+    __slots__ = ("__content",)
+
     def __init__(self, source):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -1,4 +1,5 @@
 from dnload.glsl_block import GlslBlock
+from dnload.glsl_block import emitted_head
 from dnload.glsl_block import extract_tokens
 from dnload.glsl_block_statement import glsl_parse_statements
 
@@ -9,19 +10,24 @@ from dnload.glsl_block_statement import glsl_parse_statements
 class GlslBlockReturn(GlslBlock):
     """Return block."""
 
+    __slots__ = ()
+
     def __init__(self, lst):
         """Constructor."""
         GlslBlock.__init__(self)
         # Hierarchy.
         self.addChildren(lst)
 
-    def format(self, force):
-        """Return formatted output."""
-        ret = "".join(map(lambda x: x.format(force), self._children))
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
+        start = len(sink)
+        for ii in self._children:
+            ii.emit(sink, force)
         # Statement starting with paren does not need the space.
-        if ret[:1] == "(":
-            return "return" + ret
-        return "return " + ret
+        if emitted_head(sink, start) == "(":
+            sink.insert(start, "return")
+        else:
+            sink.insert(start, "return ")
 
     def isEmptyReturn(self):
         """Tell if this return statement is empty."""
@@ -1,5 +1,6 @@
 from dnload.common import is_verbose
 from dnload.glsl_block import GlslBlock
+from dnload.glsl_block import emitted_head
 from dnload.glsl_block import extract_tokens
 from dnload.glsl_block_assignment import glsl_parse_assignment
 from dnload.glsl_block_assignment import is_glsl_block_assignment
@@ -24,6 +25,8 @@ from dnload.glsl_block_unary import is_glsl_block_unary
 class GlslBlockScope(GlslBlock):
     """Scope block."""
 
+    __slots__ = ("__allow_squash", "__explicit", "__squashable")
+
     def __init__(self, lst, explicit):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -41,56 +44,77 @@ class GlslBlockScope(GlslBlock):
         self.addChildren(lst)
 
     def collapseContents(self, mode):
-        """Perform comma squash on contents."""
+        """Perform comma squash on contents in single sweeps. Return true if contents changed."""
         if mode != "full":
             return False
         # Enable squashing and return.
         if self.__squashable and (not self._children) and (not self.__allow_squash):
             self.__allow_squash = True
             return True
+        ret = False
         # Collapse statements into return statements, if possible.
-        for ii in range(1, len(self._children)):
-            aa = self._children[ii - 1]
-            bb = self._children[ii]
-            aa_mergable = is_glsl_block_assignment(aa) or is_glsl_block_call(aa) or is_glsl_block_unary(aa)
-            bb_mergable = is_glsl_block_return(bb) and (not bb.isEmptyReturn())
-            if aa_mergable and bb_mergable:
-                aa.replaceTerminator(",")
-                aa.removeFromParent()
-                bb.addChildren(aa, True)
-                return True
-        # Comma-collapse other contents, if possible.
-        for ii in range(1, len(self._children)):
-            aa = self._children[ii - 1]
-            bb = self._children[ii]
-            aa_mergable = is_glsl_block_assignment(aa) or is_glsl_block_call(aa) or is_glsl_block_unary(aa)
-            bb_mergable = is_glsl_block_assignment(bb) or is_glsl_block_call(bb) or is_glsl_block_unary(bb)
-            # Assignment can start a group.
-            if aa_mergable and bb_mergable:
-                vv = GlslBlockGroup(bb)
-                self.replaceChild(ii - 1, vv)
-                aa.replaceTerminator(",")
-                vv.addChildren(aa, True)
-                return True
-            # Append into group.
-            if is_glsl_block_group(aa) and bb_mergable:
-                aa.getChildren()[-1].replaceTerminator(",")
-                bb.removeFromParent()
-                aa.addChildren(bb)
-                return True
-        return False
+        lst = []
+        for ii in self._children:
+            if is_glsl_block_return(ii) and (not ii.isEmptyReturn()):
+                # Preceding statements are prepended in reverse order to keep their order.
+                while lst and is_comma_mergable(lst[-1]):
+                    aa = lst.pop()
+                    aa.replaceTerminator(",")
+                    aa.setParent(None)
+                    ii.addChildren(aa, True)
+                    ret = True
+            lst += [ii]
+        # Comma-collapse other contents, if possible. Statements after returns have been merged do not precede returns.
+        children = lst
+        lst = []
+        groups = []
+        for ii in children:
+            if lst and is_comma_mergable(ii):
+                aa = lst[-1]
+                # Assignment can start a group.
+                if is_comma_mergable(aa):
+                    ii.setParent(None)
+                    vv = GlslBlockGroup(ii)
+                    aa.setParent(None)
+                    aa.replaceTerminator(",")
+                    vv.addChildren(aa, True)
+                    groups += [vv]
+                    lst[-1] = vv
+                    ret = True
+                    continue
+                # Append into group.
+                if is_glsl_block_group(aa):
+                    aa.getChildren()[-1].replaceTerminator(",")
+                    ii.setParent(None)
+                    aa.addChildren(ii)
+                    ret = True
+                    continue
+            lst += [ii]
+        if ret:
+            self._children = lst
+            for ii in groups:
+                ii.setParent(self)
+            self.bumpVersion()
+        return ret
 
-    def format(self, force):
-        """Return formatted output."""
-        ret = "".join(map(lambda x: x.format(force), self._children))
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
         if (len(self._children) > 1) or (self.__explicit and (not self.__squashable)):
-            return "{%s}" % (ret)
+            sink.append("{")
+            for ii in self._children:
+                ii.emit(sink, force)
+            sink.append("}")
+            return
+        start = len(sink)
+        for ii in self._children:
+            ii.emit(sink, force)
         # Empty scope squashing may or may not be allowed.
-        if (not ret) and self.__squashable:
+        if (not emitted_head(sink, start)) and self.__squashable:
+            del sink[start:]
             if self.__allow_squash:
-                return ";"
-            return "{}"
-        return ret
+                sink.append(";")
+            else:
+                sink.append("{}")
 
     def isExplicit(self):
         """Accessor."""
@@ -176,6 +200,10 @@ def glsl_parse_scope(source, explicit=True):
     # No scope found.
     return (None, source)
 
+def is_comma_mergable(op):
+    """Tell if given block can be merged into a comma-separated statement."""
+    return is_glsl_block_assignment(op) or is_glsl_block_call(op) or is_glsl_block_unary(op)
+
 def is_glsl_block_scope(op):
     """Tell if given object is GlslBlockScope."""
     return isinstance(op, GlslBlockScope)
@@ -12,6 +12,8 @@ from dnload.template import Template
 # Globals ##############################
 ########################################
 
+g_cstr_split = re.compile(r'([^;\n{}]*)([;\n{}]?)')
+
 g_template_glsl_header = Template("""static const char *[[VARIABLE_NAME]] = \"\"
 #if defined([[DEFINITION_LD]])
 \"[[FILE_NAME]]\"
@@ -36,6 +38,8 @@ static const char *[[VARIABLE_NAME]] = \"\"
 class GlslBlockSource(GlslBlock):
     """GLSL source file abstraction."""
 
+    __slots__ = ("__chain", "__content", "__definition_ld", "__filename", "__output", "__output_name", "__type", "__variable_name")
+
     def __init__(self, definition_ld, filename, output_name=None, varname=None):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -44,6 +48,7 @@ class GlslBlockSource(GlslBlock):
         self.__output_name = output_name
         self.__variable_name = varname
         self.__content = ""
+        self.__output = None
         self.detectType()
 
     def detectType(self):
@@ -67,20 +72,27 @@ class GlslBlockSource(GlslBlock):
             else:
                 print(output_message + " not detected, assuming generic.")
 
-    def format(self, force):
-        """Return formatted output."""
-        return "".join(map(lambda x: x.format(force), self._children))
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
+        for ii in self._children:
+            ii.emit(sink, force)
+
+    def formatOutput(self):
+        """Return formatted output, or output set from cache."""
+        if self.__output is None:
+            return self.format(True)
+        return self.__output
 
     def generateHeaderOutput(self):
         """Generate output to be written into a file."""
-        ret = self.format(True)
+        ret = self.formatOutput()
         ret = "\n".join(map(lambda x: "\"%s\"" % (x), glsl_cstr_readable(ret)))
         subst = {"DEFINITION_LD": self.__definition_ld, "FILE_NAME": os.path.basename(self.__filename), "SOURCE": ret, "VARIABLE_NAME": self.getVariableName()}
         return g_template_glsl_header.format(subst)
 
     def generatePrintOutput(self):
         """Generate output to be written to output."""
-        ret = self.format(True)
+        ret = self.formatOutput()
         ret = "\n".join(map(lambda x: "\"%s\"" % (x), glsl_cstr_readable(ret)))
         subst = {"SOURCE": ret, "VARIABLE_NAME": self.getVariableName()}
         return g_template_glsl_print.format(subst)
@@ -93,6 +105,10 @@ class GlslBlockSource(GlslBlock):
         """Accessor."""
         return self.__filename
 
+    def getPreprocessedContent(self):
+        """Get preprocessed content and preprocessor directives. Only valid before parsing."""
+        return self.format(False) + self.__content
+
     def getVariableName(self):
         """Gets the variable name for this GLSL source file."""
         if self.__variable_name:
@@ -129,28 +145,26 @@ class GlslBlockSource(GlslBlock):
 
     def preprocess(self, preprocessor, source):
         """Preprocess GLSL source, store preprocessor directives into parse tree and content."""
-        content = []
-        for ii in source.splitlines():
-            block = glsl_parse_preprocessor(ii)
-            if block:
-                self.addChildren(block)
-            else:
-                content += [ii]
-        # Removed known preprocessor directives, write result into intermediate file.
+        self.preprocessContent(preprocessor, self.stripDirectives(source))
+
+    def preprocessContent(self, preprocessor, content):
+        """Preprocess GLSL source with known preprocessor directives already removed, store content."""
+        if preprocessor.supports_input():
+            self.setPreprocessed(preprocessor.preprocess_input(content, os.path.dirname(self.__filename), self.__filename))
+            return
+        # Preprocessor cannot read standard input, write content into intermediate file.
         fname = generate_temporary_filename(self.__filename + ".preprocessed")
         fd = open(fname, "w")
-        fd.write(("\n".join(content)).strip())
+        fd.write(content)
         fd.close()
-        # Preprocess and reassemble content.
-        intermediate = preprocessor.preprocess(fname)
-        content = []
-        for ii in intermediate.splitlines():
-            if not ii.strip().startswith("#"):
-                content += [ii]
-        self.__content = "\n".join(content)
+        self.setPreprocessed(preprocessor.preprocess(fname))
 
     def read(self, preprocessor):
-        """Read file contents."""
+        """Read and preprocess file contents."""
+        self.preprocess(preprocessor, self.readFile())
+
+    def readFile(self):
+        """Read file contents without preprocessing."""
         fd = open(self.__filename, "r")
         if not fd:
             raise RuntimeError("could not read GLSL source '%s'" % (fname))
@@ -162,8 +176,30 @@ class GlslBlockSource(GlslBlock):
             if self.__variable_name:
                 raise RuntimeError("variable name redefinition '%s' vs. '%s' on GLSL source '%s'" % (match.group(2), self.__variable_name, self.getFilename()))
             self.__variable_name = match.group(2)
-        # Preprocess actual content.
-        self.preprocess(preprocessor, content)
+        return content
+
+    def setPreprocessed(self, op):
+        """Set content from preprocessor output, removing line markers."""
+        content = []
+        for ii in op.splitlines():
+            if not ii.strip().startswith("#"):
+                content += [ii]
+        self.__content = "\n".join(content)
+
+    def setOutput(self, op):
+        """Set formatted output, skipping formatting of parsed content."""
+        self.__output = op
+
+    def stripDirectives(self, op):
+        """Store known preprocessor directives of given source into parse tree, return rest of the source."""
+        content = []
+        for ii in op.splitlines():
+            block = glsl_parse_preprocessor(ii)
+            if block:
+                self.addChildren(block)
+            else:
+                content += [ii]
+        return ("\n".join(content)).strip()
 
     def write(self):
         """Write compressed output."""
@@ -204,32 +240,18 @@ def extract_chain_name(op):
 
 def glsl_cstr_readable(op):
     """Make GLSL source string into a 'readable' C string array."""
-    line = ""
     ret = []
-    for ii in op:
-        if ";" == ii:
-            ret += [line + ii]
-            line = ""
-            continue
-        elif "\n" == ii:
+    for (line, separator) in g_cstr_split.findall(op):
+        if ";" == separator:
+            ret += [line + separator]
+        elif "\n" == separator:
             ret += [line + "\\n"]
-            line = ""
-            continue
-        elif "{" == ii:
-            if line:
-                ret += [line]
-            ret += ["{"]
-            line = ""
-            continue
-        elif "}" == ii:
+        else:
+            # Scope separators are on lines of their own, end of input has no separator.
             if line:
                 ret += [line]
-            ret += ["}"]
-            line = ""
-            continue
-        line += ii
-    if line:
-        ret += [line]
+            if separator:
+                ret += [separator]
     return ret
 
 def glsl_file_type_value(op):
@@ -248,6 +270,28 @@ def glsl_read_source(preprocessor, definition_ld, filename, output_name, varname
     ret.read(preprocessor)
     return ret
 
+def glsl_read_sources(preprocessor, definition_ld, lst):
+    """Read sources given as listings of filename, output name and variable name into GLSL source constructs.
+    Sources that can be preprocessed together are preprocessed in one batch."""
+    ret = []
+    batch = []
+    for (filename, output_name, varname) in lst:
+        source = GlslBlockSource(definition_ld, filename, output_name, varname)
+        content = source.stripDirectives(source.readFile())
+        if preprocessor.is_batchable(content):
+            batch += [(source, content)]
+        else:
+            source.preprocessContent(preprocessor, content)
+        ret += [source]
+    # A single source does not need batching.
+    if 1 == len(batch):
+        batch[0][0].preprocessContent(preprocessor, batch[0][1])
+    elif batch:
+        outputs = preprocessor.preprocess_batch(list(map(lambda x: (x[0].getFilename(), x[1]), batch)))
+        for ((source, content), output) in zip(batch, outputs):
+            source.setPreprocessed(output)
+    return ret
+
 def is_glsl_block_source(op):
     """Tell if given object is a GLSL source block."""
     return isinstance(op, GlslBlockSource)
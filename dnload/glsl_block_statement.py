@@ -1,10 +1,9 @@
-import copy
-
 from dnload.common import is_listing
 from dnload.glsl_block import GlslBlock
 from dnload.glsl_block import extract_tokens
 from dnload.glsl_paren import GlslParen
 from dnload.glsl_paren import is_glsl_paren
+from dnload.glsl_token import token_list_clone
 from dnload.glsl_token import token_tree_build
 from dnload.glsl_token import token_tree_simplify
 from dnload.glsl_operator import is_glsl_operator
@@ -16,6 +15,8 @@ from dnload.glsl_operator import is_glsl_operator
 class GlslBlockStatement(GlslBlock):
     """Statement block."""
 
+    __slots__ = ("__content", "__terminator")
+
     def __init__(self, lst, terminator=""):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -27,12 +28,17 @@ class GlslBlockStatement(GlslBlock):
         self.addAccesses(lst)
         self.addNamesUsed(lst)
 
-    def format(self, force):
-        """Return formatted output."""
-        lst = ""
-        if 0 < len(self.__content):
-            lst = "".join(map(lambda x: x.format(force), self.__content))
-        return lst + self.__terminator.format(force)
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
+        prev = ""
+        for ii in self.__content:
+            fragment = ii.format(force)
+            # Adjacent signs would be read as increment or decrement.
+            if (fragment[:1] in ("+", "-")) and prev.endswith(fragment[0]):
+                sink.append(" ")
+            sink.append(fragment)
+            prev = fragment
+        sink.append(self.__terminator.format(force))
 
     def getTerminator(self):
         """Accessor."""
@@ -66,8 +72,8 @@ class GlslBlockStatement(GlslBlock):
         for ii in range(len(self.__content)):
             vv = self.__content[ii]
             if name is vv:
-                # Perform deep copy of tokens to prevent same object existing in multiple places.
-                self.__content[ii:ii + 1] = [GlslParen("(")] + copy.deepcopy(tokens) + [GlslParen(")")]
+                # Clone tokens to prevent same object existing in multiple places.
+                self.__content[ii:ii + 1] = [GlslParen("(")] + token_list_clone(tokens) + [GlslParen(")")]
                 return True
         return False
 
@@ -76,22 +82,24 @@ class GlslBlockStatement(GlslBlock):
         self.__terminator = op
 
     def simplify(self, max_simplifys):
-        """Run simplification pass on the statement."""
-        ret = 0
-        while True:
-            if (max_simplifys >= 0) and (max_simplifys <= ret):
-                break
-            content = simplify_pass(self.__content)
-            if not content and self.__content:
-                raise RuntimeError("content '%s' simplified to '%s'" % (str(map(str, self.__content)), str(content)))
-            if content == self.__content:
-                break
-            self.__content = content
-            self.clearAccesses()
-            self.clearNamesUsed()
-            self.addAccesses(self.__content)
-            self.addNamesUsed(self.__content)
-            ret += 1
+        """Run simplification on the statement."""
+        if (not self.__content) or (max_simplifys == 0):
+            return 0
+        # Tree is kept over all simplification rounds and only flattened once.
+        tree = token_tree_build(self.__content)
+        if not tree:
+            raise RuntimeError("could not build tree from '%s'" % (str(map(str, self.__content))))
+        ret = token_tree_simplify(tree, max_simplifys)
+        if not ret:
+            return 0
+        content = tree.flatten()
+        if not content:
+            raise RuntimeError("content '%s' simplified to '%s'" % (str(map(str, self.__content)), str(content)))
+        self.__content = content
+        self.clearAccesses()
+        self.clearNamesUsed()
+        self.addAccesses(self.__content)
+        self.addNamesUsed(self.__content)
         return ret
 
     def __str__(self):
@@ -144,15 +152,3 @@ def glsl_parse_statements(source, until=None):
         source = remaining
     # Everything was parsed.
     return (lst, None)
-
-def simplify_pass(lst):
-    """Run simplification pass on tokens."""
-    # Build tree and run simplify pass from there.
-    if lst:
-        tree = token_tree_build(lst)
-        if not tree:
-            raise RuntimeError("could not build tree from '%s'" % (str(map(str, lst))))
-        if token_tree_simplify(tree):
-            return tree.flatten()
-    # Nothign to simplify, just return original tree.
-    return lst
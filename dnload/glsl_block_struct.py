@@ -9,6 +9,8 @@ from dnload.glsl_block_member import glsl_parse_member_list
 class GlslBlockStruct(GlslBlock):
     """Struct declaration."""
 
+    __slots__ = ("__member_accesses", "__members", "__name", "__size", "__type_name")
+
     def __init__(self, type_name, members, name=None, size=0):
         """Constructor."""
         GlslBlock.__init__(self)
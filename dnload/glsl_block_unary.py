@@ -10,17 +10,19 @@ from dnload.glsl_operator import is_glsl_operator
 class GlslBlockUnary(GlslBlock):
     """Unary statement block."""
 
+    __slots__ = ()
+
     def __init__(self, statement):
         """Constructor."""
         GlslBlock.__init__(self)
         # Hierarchy.
         self.addChildren(statement)
 
-    def format(self, force):
-        """Return formatted output."""
+    def emit(self, sink, force):
+        """Append formatted output fragments into given sink."""
         if len(self._children) != 1:
-            raise RuntimeError("GlslBlockUnary::format(), child count != 1")
-        return "%s" % ("".join(map(lambda x: x.format(force), self._children)))
+            raise RuntimeError("GlslBlockUnary::emit(), child count != 1")
+        self._children[0].emit(sink, force)
 
     def replaceTerminator(self, op):
         """Replace terminator with given operator."""
@@ -9,6 +9,8 @@ from dnload.glsl_block_layout import glsl_parse_layout
 class GlslBlockUniform(GlslBlock):
     """Uniform declaration."""
 
+    __slots__ = ("__layout", "__name", "__size", "__typeid")
+
     def __init__(self, layout, typeid, size, name):
         """Constructor."""
         GlslBlock.__init__(self)
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+
+from dnload.common import is_verbose
+
+########################################
+# Globals ##############################
+########################################
+
+g_glsl_cache_size = 32 * 1024 * 1024
+
+########################################
+# GlslCache ############################
+########################################
+
+class GlslCache:
+    """On-disk cache of crunched GLSL output, addressed by content hash."""
+
+    def __init__(self, directory, max_size=g_glsl_cache_size):
+        """Constructor."""
+        self.__directory = directory
+        self.__max_size = max_size
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits within its size bound."""
+        entries = []
+        size = 0
+        for ii in os.listdir(self.__directory):
+            if not ii.endswith(".json"):
+                continue
+            fname = os.path.join(self.__directory, ii)
+            stat = os.stat(fname)
+            entries += [(stat.st_mtime, stat.st_size, fname)]
+            size += stat.st_size
+        for (mtime, entry_size, fname) in sorted(entries):
+            if size <= self.__max_size:
+                break
+            os.remove(fname)
+            size -= entry_size
+
+    def generateFilename(self, key):
+        """Get filename for cache entry with given key."""
+        return os.path.join(self.__directory, key + ".json")
+
+    def load(self, key):
+        """Load cache entry with given key. Return None if not found."""
+        fname = self.generateFilename(key)
+        try:
+            fd = open(fname, "r")
+            ret = json.load(fd)
+            fd.close()
+            # Mark entry as recently used.
+            os.utime(fname)
+        except (OSError, ValueError):
+            return None
+        if is_verbose():
+            print("Loaded GLSL cache entry: '%s'" % (fname))
+        return ret
+
+    def store(self, key, op):
+        """Store cache entry with given key."""
+        fname = self.generateFilename(key)
+        try:
+            os.makedirs(self.__directory, exist_ok=True)
+            # Write into a temporary file first so concurrent builds never see partial entries.
+            temporary = "%s.%i" % (fname, os.getpid())
+            fd = open(temporary, "w")
+            json.dump(op, fd)
+            fd.close()
+            os.replace(temporary, fname)
+            self.evict()
+        except OSError as ee:
+            if is_verbose():
+                print("WARNING: could not store GLSL cache entry '%s': %s" % (fname, str(ee)))
+            return
+        if is_verbose():
+            print("Stored GLSL cache entry: '%s'" % (fname))
+
+########################################
+# Functions ############################
+########################################
+
+def glsl_cache_directory():
+    """Get default GLSL cache directory."""
+    ret = os.environ.get("XDG_CACHE_HOME")
+    if not ret:
+        ret = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(ret, "dnload", "glsl")
+
+def glsl_cache_key(lst):
+    """Generate cache key from given listing of strings."""
+    ret = hashlib.sha256()
+    for ii in lst:
+        data = str(ii).encode("utf-8")
+        # Prefix with length so element boundaries are part of the key.
+        ret.update(b"%i:" % (len(data)))
+        ret.update(data)
+    return ret.hexdigest()
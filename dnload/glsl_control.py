@@ -5,11 +5,17 @@
 class GlslControl:
     """GLSL control flow element."""
 
+    __slots__ = ("__control1", "__control2")
+
     def __init__(self, control1, control2=None):
         """Constructor."""
         self.__control1 = control1
         self.__control2 = control2
 
+    def clone(self):
+        """Control elements are never modified, the same object can be used in another location."""
+        return self
+
     def format(self, force):
         """Return formatted output."""
         if self.__control2:
@@ -0,0 +1,51 @@
+from dnload.glsl_block_assignment import is_glsl_block_assignment
+from dnload.glsl_name_table import has_position_in_range
+from dnload.glsl_name_table import insert_position
+
+########################################
+# GlslDefUse ###########################
+########################################
+
+class GlslDefUse:
+    """Def-use chains within one parent scope, indexed by preorder position of the blocks under it.
+    Valid until the hierarchy under the parent is modified."""
+
+    def __init__(self, parent):
+        """Constructor."""
+        self.__positions = {}
+        self.__definitions = {}
+        self.__uses = {}
+        flattened = parent.getFlattened()
+        for (position, block) in enumerate(flattened):
+            self.__positions[id(block)] = position
+            # Blocks either use a name object or not, multiple references within one block count once.
+            for ii in block.getUsedNames():
+                key = id(ii)
+                if key in self.__uses:
+                    if self.__uses[key][-1] != position:
+                        self.__uses[key] += [position]
+                else:
+                    self.__uses[key] = [position]
+            if is_glsl_block_assignment(block):
+                insert_position(self.__definitions, block.getName().getSymbol(), position)
+        self.__length = len(flattened)
+
+    def getLastUse(self, names):
+        """Get position of the block where all given names have been used, one past the last position if never."""
+        if not names:
+            return 0
+        lst = []
+        for ii in names:
+            lst += self.__uses.get(id(ii), [])
+        if len(lst) < len(names):
+            return self.__length
+        lst.sort()
+        return lst[len(names) - 1]
+
+    def getPosition(self, block):
+        """Get preorder position of given block. Return None if not found."""
+        return self.__positions.get(id(block))
+
+    def hasDefinition(self, name, first, last):
+        """Tell if given name is assigned into at a position within given inclusive range."""
+        return has_position_in_range(self.__definitions.get(name.getSymbol()), first, last)
@@ -7,6 +7,8 @@ from dnload.glsl_int import interpret_int
 class GlslFloat:
     """GLSL integer."""
 
+    __slots__ = ("__allow_integrify", "__integer1", "__integer2", "__number", "__sign")
+
     def __init__(self, integer1, integer2):
         """Constructor."""
         if integer2.getSign():
@@ -20,6 +22,16 @@ class GlslFloat:
         if float(self.format(False)) != self.__number:
             raise RuntimeError("incorrect float parse: '%f' vs. '%s'" % (self.__number, self.format(False)))
 
+    def clone(self):
+        """Create a copy for use in another location."""
+        ret = GlslFloat.__new__(GlslFloat)
+        ret.__integer1 = self.__integer1.clone()
+        ret.__integer2 = self.__integer2.clone()
+        ret.__number = self.__number
+        ret.__sign = self.__sign
+        ret.__allow_integrify = self.__allow_integrify
+        return ret
+
     def format(self, force):
         """Return formatted output."""
         if self.__integer1.getInt() == 0:
@@ -32,6 +44,10 @@ class GlslFloat:
             return str(self.__integer1.getInt())
         return "%s.%s" % (str(self.__integer1.getInt()), self.__integer2.getStr().rstrip("0"))
 
+    def getDecimals(self):
+        """Get number of decimals expressed."""
+        return len(self.__integer2.getStr().rstrip("0"))
+
     def getFloat(self):
         """Accessor."""
         return self.__number
@@ -5,10 +5,16 @@
 class GlslInOut:
     """GLSL in/out directive element."""
 
+    __slots__ = ("__inout",)
+
     def __init__(self, inout):
         """Constructor."""
         self.__inout = inout
 
+    def clone(self):
+        """Inout directives are never modified, the same object can be used in another location."""
+        return self
+
     def format(self, force):
         """Return formatted output."""
         return self.__inout
@@ -7,6 +7,8 @@ import re
 class GlslInt:
     """GLSL integer."""
 
+    __slots__ = ("__number", "__sign", "__string")
+
     def __init__(self, source):
         """Constructor."""
         if source[0] in ("-", "+"):
@@ -20,6 +22,14 @@ class GlslInt:
             self.__string = source
         self.__number = int(source)
 
+    def clone(self):
+        """Create a copy for use in another location."""
+        ret = GlslInt.__new__(GlslInt)
+        ret.__number = self.__number
+        ret.__sign = self.__sign
+        ret.__string = self.__string
+        return ret
+
     def format(self, force):
         """Return formatted output."""
         return str(self.__number)
@@ -86,7 +96,7 @@ class GlslInt:
 
 def interpret_int(source):
     """Try to interpret integer."""
-    if re.match(r'^\-?\d+f?$', source):
+    if match_int(source):
         # Suffixing number with 'f' is not allowd according to the spec, but NVidia accepts it.
         if source[-1] == "f":
             print("WARNING: GLSL: discarding number literal suffix for '%s'" % (source))
@@ -101,3 +111,9 @@ def is_glsl_int(op):
 def is_glsl_int_unsigned(op):
     """Tell if token is integer."""
     return isinstance(op, GlslInt) and (op.getInt() >= 0)
+
+def match_int(op):
+    """Check if operand is an integer literal."""
+    if re.match(r'^\-?\d+f?$', op):
+        return True
+    return False
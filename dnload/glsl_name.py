@@ -10,12 +10,18 @@ from dnload.glsl_type import interpret_pseudo_type
 class GlslName:
     """GLSL name identifier."""
 
+    __slots__ = ("__access", "__name", "__name_table", "__rename", "__resolved", "__symbol", "__typeid")
+
     def __init__(self, source):
         """Constructor."""
         self.__name = source
         self.__typeid = None
         self.__rename = None
         self.__access = None
+        self.__name_table = None
+        # Comparisons use interned integers of original and resolved names.
+        self.__symbol = intern_name(source)
+        self.__resolved = self.__symbol
         # Reserved words are considered locked in all cases.
         if self.__name in get_list_locked():
             self.__rename = self.__name
@@ -29,6 +35,18 @@ class GlslName:
         elif self.__name in g_vec:
             self.setType(interpret_pseudo_type("vec"))
 
+    def clone(self):
+        """Create a copy for use in another location. Access must be relinked afterwards."""
+        ret = GlslName.__new__(GlslName)
+        ret.__name = self.__name
+        ret.__typeid = self.__typeid
+        ret.__rename = self.__rename
+        ret.__access = self.__access
+        ret.__name_table = None
+        ret.__symbol = self.__symbol
+        ret.__resolved = self.__resolved
+        return ret
+
     def format(self, force):
         """Return formatted output."""
         if not self.__rename:
@@ -47,6 +65,14 @@ class GlslName:
         """Gets the original, non-renamed name."""
         return self.__name
 
+    def getOriginalSymbol(self):
+        """Gets the interned integer of the original, non-renamed name."""
+        return self.__symbol
+
+    def getSymbol(self):
+        """Gets the interned integer of the resolved name."""
+        return self.__resolved
+
     def getType(self):
         """Accessor."""
         return self.__typeid
@@ -64,6 +90,15 @@ class GlslName:
         if not isinstance(op, str):
             raise RuntimeError("rename must be string, '%s' given" % (str(op)))
         self.__rename = op
+        self.__resolved = intern_name(op)
+        # Name table needs to know about the new locked name.
+        if self.__name_table:
+            self.__name_table.lockName(self)
+
+    def relink(self, clones):
+        """Point access to its clone, given a dict of clones by id of the original."""
+        if self.__access:
+            self.__access = clones.get(id(self.__access), self.__access)
 
     def resolveName(self):
         """Get resolved name, this is the locked name or original name if not locked."""
@@ -77,6 +112,10 @@ class GlslName:
             raise RuntimeError("'%s' already has access '%s'" % (str(self), str(self.__access)))
         self.__access = op
 
+    def setNameTable(self, op):
+        """Set name table to notify when this name is locked."""
+        self.__name_table = op
+
     def setType(self, op):
         """Set type information of this."""
         if self.__typeid and (self.__typeid != op):
@@ -86,16 +125,26 @@ class GlslName:
     def __eq__(self, other):
         """Equals operator."""
         if is_glsl_name(other):
-            return (other.resolveName() == self.resolveName())
+            return (other.__resolved == self.__resolved)
         return (self.resolveName() == other)
 
     def __ne__(self, other):
         """Not equals operator."""
         return not (self == other)
 
+    def __getstate__(self):
+        """Get state for pickling. Interned integers and name tables are only valid within one process."""
+        return (self.__name, self.__typeid, self.__rename, self.__access, None)
+
     def __hash__(self):
         """Hashing operator."""
-        return hash(self.__name)
+        return self.__symbol
+
+    def __setstate__(self, op):
+        """Set state from pickling, interning names again."""
+        (self.__name, self.__typeid, self.__rename, self.__access, self.__name_table) = op
+        self.__symbol = intern_name(self.__name)
+        self.__resolved = intern_name(self.resolveName())
 
     def __str__(self):
         """String representation."""
@@ -107,6 +156,8 @@ class GlslName:
 # Globals ##############################
 ########################################
 
+g_interned = {}
+
 g_locked = (
     "abs",
     "acos",
@@ -196,14 +247,28 @@ def get_list_primitives():
     """Get list of primitive words."""
     return g_primitives
 
+def intern_name(op):
+    """Get interned integer for given name string, allocating a new one if necessary."""
+    ret = g_interned.get(op)
+    if ret is None:
+        ret = len(g_interned)
+        g_interned[op] = ret
+    return ret
+
 def interpret_name(source):
     """Try to interpret name identifier."""
     # All reserved strings other than names here should have been interpreted before.
     # Names are interpreted last.
-    if re.match(r'^([A-Za-z][A-Za-z0-9_]*)$', source, re.I):
+    if match_name(source):
         return GlslName(source)
     return None
 
 def is_glsl_name(op):
     """Tell if token is type identifier."""
     return isinstance(op, GlslName)
+
+def match_name(op):
+    """Check if operand is a valid name identifier."""
+    if re.match(r'^([A-Za-z][A-Za-z0-9_]*)$', op, re.I):
+        return True
+    return False
@@ -13,6 +13,8 @@ class GlslNameStrip:
         """Constructor."""
         self.__blocks = [block]
         self.__names = []
+        # Used and declared name lists may contain the exact same name, identities of names are tracked.
+        self.__name_ids = set()
         self.addName(name)
 
     def addBlock(self, op):
@@ -25,10 +27,9 @@ class GlslNameStrip:
             raise RuntimeError("not a GLSL name: %s" % (str(name)))
         if (self.getNameCount() >= 1) and (name != self.__names[0]):
             raise RuntimeError("trying to append unrelated names: %s != %s" % (str(self.__names[0]), str(name)))
-        # Used and declared name lists may contain the exact same name.
-        for ii in self.__names:
-            if ii is name:
-                return
+        if id(name) in self.__name_ids:
+            return
+        self.__name_ids.add(id(name))
         self.__names += [name]
 
     def appendTo(self, op):
@@ -61,7 +62,7 @@ class GlslNameStrip:
         for kk in uses.keys():
             name_list = uses[kk]
             if 1 >= len(name_list):
-                print("WARNING: member '%s' of '%s' not accessed" % (name_list[0].getName(), str(block)))
+                print("WARNING: member '%s' of '%s' not accessed" % (name_list[0].getName(), str(self.getBlock())))
             typeid = name_list[0].getType()
             if not typeid:
                 raise RuntimeError("name '%s' has no type" % (name_list[0]))
@@ -110,18 +111,34 @@ class GlslNameStrip:
         for ii in self.__names:
             ii.lock(op)
 
+    def removeName(self, op):
+        """Remove one name object from the list. Declared name cannot be removed."""
+        for ii in range(1, len(self.__names)):
+            if self.__names[ii] is op:
+                self.__names.pop(ii)
+                self.__name_ids.discard(id(op))
+                return
+        raise RuntimeError("name %s not found in %s" % (str(op), str(self)))
+
+    def updateNameType(self, op):
+        """Update type of one name and check for errors."""
+        typeid = self.getName().getType()
+        if not typeid:
+            raise RuntimeError("declared name in GlslNameStrip has no type id")
+        found_type = op.getType()
+        if found_type:
+            if typeid != found_type:
+                raise RuntimeError("conflicting type found for %s: %s vs. %s" % (str(op), str(typeid), str(found_type)))
+        else:
+            op.setType(typeid)
+
     def updateNameTypes(self):
         """Update all name types and check for errors."""
         typeid = self.getName().getType()
         if not typeid:
             raise RuntimeError("declared name in GlslNameStrip has no type id")
         for ii in self.__names[1:]:
-            found_type = ii.getType()
-            if found_type:
-                if typeid != found_type:
-                    raise RuntimeError("conflicting type found for %s: %s vs. %s" % (str(ii), str(typeid), str(found_type)))
-            else:
-                ii.setType(typeid)
+            self.updateNameType(ii)
 
     def __lt__(lhs, rhs):
         """Comparison operator."""
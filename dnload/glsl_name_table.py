@@ -0,0 +1,120 @@
+import bisect
+
+from dnload.glsl_block_uniform import is_glsl_block_uniform
+from dnload.glsl_stats import glsl_stats_count
+
+########################################
+# GlslNameTable ########################
+########################################
+
+class GlslNameTable:
+    """Table of locked names within one source, indexed by preorder position of the blocks."""
+
+    def __init__(self, source):
+        """Constructor."""
+        self.__positions = {}
+        self.__declared = {}
+        self.__used = {}
+        self.__uniforms = {}
+        self.__pending = {}
+        # Sets of names declared within scopes, created on demand and kept up to date as names are locked.
+        self.__scope_names = {}
+        self.addBlock(source, 0)
+
+    def addBlock(self, block, position):
+        """Add block and its children starting from given preorder position. Return next free position."""
+        for ii in block.getDeclaredNames():
+            self.addName(ii, position, self.__declared, is_glsl_block_uniform(block))
+        for ii in block.getUsedNames():
+            self.addName(ii, position, self.__used, False)
+        last = position
+        for ii in block.getChildren():
+            last = self.addBlock(ii, last + 1)
+        self.__positions[id(block)] = (position, last)
+        return last
+
+    def addName(self, name, position, table, uniform):
+        """Add name at given position into given table, or postpone until the name is locked."""
+        if name.isLocked():
+            insert_position(table, name.resolveName(), position)
+            if table is self.__declared:
+                for (first, last, names) in self.__scope_names.values():
+                    if (first < position) and (position <= last):
+                        names.add(name.resolveName())
+            if uniform:
+                self.__uniforms[name.resolveName()] = self.__uniforms.get(name.resolveName(), 0) + 1
+            return
+        key = id(name)
+        if key in self.__pending:
+            self.__pending[key] += [(position, table, uniform)]
+        else:
+            self.__pending[key] = [(position, table, uniform)]
+            name.setNameTable(self)
+
+    def getPendingPositions(self, name):
+        """Get positions of an unlocked name as listing of (position, declared, uniform) tuples."""
+        ret = []
+        for (position, table, uniform) in self.__pending.get(id(name), []):
+            ret += [(position, table is self.__declared, uniform)]
+        return ret
+
+    def getPositionRange(self, block):
+        """Get preorder position of given block and last position within its subtree. Return None if not found."""
+        return self.__positions.get(id(block))
+
+    def getScopeNames(self, parent):
+        """Get set of locked names declared within the subtree of given parent. Kept up to date as names are locked."""
+        key = id(parent)
+        if key in self.__scope_names:
+            return self.__scope_names[key][2]
+        (first, last) = self.__positions[key]
+        ret = set()
+        for (name, positions) in self.__declared.items():
+            if has_position_in_range(positions, first + 1, last):
+                ret.add(name)
+        self.__scope_names[key] = (first, last, ret)
+        return ret
+
+    def hasDeclaredName(self, name):
+        """Tell if given locked name is declared anywhere within the source."""
+        return name in self.__declared
+
+    def hasNameConflict(self, parent, block, name):
+        """Tell if given locked name would conflict with a block within the subtree of given parent."""
+        glsl_stats_count("conflict_checks")
+        (first, last) = self.__positions[id(parent)]
+        # Declared names take the name out of the scope permanently.
+        if has_position_in_range(self.__declared.get(name), first + 1, last):
+            return True
+        # Other blocks reserve names from their inception onward.
+        position = self.__positions.get(id(block))
+        if position and (first < position[0]) and (position[0] <= last):
+            return has_position_in_range(self.__used.get(name), position[0], last)
+        return False
+
+    def hasUniformName(self, name):
+        """Tell if given locked name is declared by an uniform block within the source."""
+        return name in self.__uniforms
+
+    def lockName(self, name):
+        """Move a name that was just locked from pending into the table."""
+        for (position, table, uniform) in self.__pending.pop(id(name), []):
+            self.addName(name, position, table, uniform)
+
+########################################
+# Functions ############################
+########################################
+
+def has_position_in_range(lst, first, last):
+    """Tell if sorted list of positions contains a position within given inclusive range."""
+    if not lst:
+        return False
+    index = bisect.bisect_left(lst, first)
+    return (index < len(lst)) and (lst[index] <= last)
+
+def insert_position(table, name, position):
+    """Insert position for given name into a table of sorted position lists."""
+    if name in table:
+        bisect.insort(table[name], position)
+    else:
+        table[name] = [position]
@@ -5,6 +5,8 @@
 class GlslOperator:
     """Operator class."""
 
+    __slots__ = ("__operator",)
+
     def __init__(self, operator):
         """Constructor."""
         self.__operator = operator
@@ -21,6 +23,10 @@ class GlslOperator:
             return lhs - rhs
         raise RuntimeError("don't know how to apply operator '%s'" % (self.__operator))
 
+    def clone(self):
+        """Create a copy for use in another location. Operators are modified in place during simplification."""
+        return GlslOperator(self.__operator)
+
     def format(self, force):
         """Return formatted output."""
         return self.__operator
@@ -5,10 +5,16 @@
 class GlslParen:
     """Paren construct."""
 
+    __slots__ = ("__paren",)
+
     def __init__(self, paren):
         """Constructor."""
         self.__paren = paren
 
+    def clone(self):
+        """Create a copy for use in another location. Parens are searched by identity during simplification."""
+        return GlslParen(self.__paren)
+
     def format(self, force):
         """Return formatted output."""
         return self.__paren
@@ -7,6 +7,7 @@ from dnload.glsl_block_inout import glsl_parse_inout
 from dnload.glsl_block_pervertex import glsl_parse_pervertex
 from dnload.glsl_block_struct import glsl_parse_struct
 from dnload.glsl_block_uniform import glsl_parse_uniform
+from dnload.glsl_token_cursor import GlslTokenCursor
 
 ########################################
 # Functions ############################
@@ -15,35 +16,21 @@ from dnload.glsl_block_uniform import glsl_parse_uniform
 def glsl_parse(source):
     """Parse given source."""
     content = tokenize(source)
-    return glsl_parse_tokenized(content)
+    return glsl_parse_tokenized(GlslTokenCursor(content))
 
 def glsl_parse_tokenized(source):
     """Parse tokenized source."""
-    # End of input.
-    if not source:
-        return []
-    # Try default parses for global scope.
-    (block, remaining) = glsl_parse_inout(source)
-    if block:
-        return [block] + glsl_parse_tokenized(remaining)
-    (block, remaining) = glsl_parse_struct(source)
-    if block:
-        return [block] + glsl_parse_tokenized(remaining)
-    (block, remaining) = glsl_parse_pervertex(source)
-    if block:
-        return [block] + glsl_parse_tokenized(remaining)
-    (block, remaining) = glsl_parse_uniform(source)
-    if block:
-        return [block] + glsl_parse_tokenized(remaining)
-    (block, remaining) = glsl_parse_function(source)
-    if block:
-        return [block] + glsl_parse_tokenized(remaining)
-    # Try parses normally for local scope.
-    (block, remaining) = glsl_parse_declaration(source)
-    if block:
-        return [block] + glsl_parse_tokenized(remaining)
-    (block, remaining) = glsl_parse_assignment(source)
-    if block:
-        return [block] + glsl_parse_tokenized(remaining)
-    # Fallback, should never happen.
-    return glsl_parse_default(source)
+    ret = []
+    # Iterate until end of input.
+    while source:
+        # Try default parses for global scope, then parses normally for local scope.
+        for ii in (glsl_parse_inout, glsl_parse_struct, glsl_parse_pervertex, glsl_parse_uniform, glsl_parse_function, glsl_parse_declaration, glsl_parse_assignment):
+            (block, remaining) = ii(source)
+            if block:
+                break
+        # Fallback, should never happen.
+        if not block:
+            return ret + glsl_parse_default(source)
+        ret += [block]
+        source = remaining
+    return ret
@@ -0,0 +1,129 @@
+import lzma
+import multiprocessing
+import pickle
+
+from dnload.common import is_verbose
+from dnload.common import set_verbose
+from dnload.glsl import Glsl
+from dnload.glsl_cache import glsl_cache_key
+
+########################################
+# Globals ##############################
+########################################
+
+g_glsl_search_renamers = ("greedy", "graph")
+
+g_glsl_search_sources = None
+
+########################################
+# Functions ############################
+########################################
+
+def glsl_search(glsl_db, mode, jobs, cache, key, compression):
+    """Crunch parsed GLSL database under combinations of limits and keep the output that compresses smallest.
+    Results are memoised in given cache, if any, under keys derived from given input key."""
+    data = pickle.dumps(glsl_db.getSources())
+    # Crunch without limits first to know how many operations there are to limit.
+    unlimited = (mode, -1, -1, -1, g_glsl_search_renamers[0])
+    results = glsl_search_run([unlimited], data, jobs, cache, key)
+    if not results[unlimited]["outputs"]:
+        raise RuntimeError("GLSL search failed to crunch without limits")
+    (inlines, renames, simplifys) = results[unlimited]["counts"]
+    candidates = []
+    for ii in glsl_search_limits(inlines):
+        for jj in glsl_search_limits(renames):
+            for kk in glsl_search_limits(simplifys):
+                for renamer in g_glsl_search_renamers:
+                    candidate = (mode, ii, jj, kk, renamer)
+                    if not (candidate in results):
+                        candidates += [candidate]
+    results.update(glsl_search_run(candidates, data, jobs, cache, key))
+    # Select by compressed size, then by uncompressed size. Ties go to the earliest candidate, starting with no limits.
+    best = None
+    for ii in [unlimited] + candidates:
+        result = results[ii]
+        if not result["outputs"]:
+            continue
+        output = "".join(result["outputs"])
+        score = (glsl_search_score(output, compression), len(output))
+        if is_verbose():
+            print("GLSL search: inlines %i, renames %i, simplifys %i, rename %s: %i bytes compressed, %i bytes" % (ii[1:] + score))
+        if (best is None) or (score < best[0]):
+            best = (score, ii)
+    (score, selected) = best
+    if is_verbose():
+        print("GLSL search selected: --glsl-inlines %i --glsl-renames %i --glsl-simplifys %i --glsl-rename %s (%i bytes compressed)" % (selected[1:] + score[:1]))
+    glsl_db.setOutputs(results[selected]["outputs"])
+    return selected[1:]
+
+def glsl_search_crunch(task):
+    """Crunch a copy of the parsed sources with given limits. Return outputs and operation counts, both None on failure."""
+    (mode, inlines, renames, simplifys, renamer) = task
+    glsl_db = Glsl()
+    for ii in pickle.loads(g_glsl_search_sources):
+        glsl_db.addSource(ii)
+    glsl_db.assembleChains()
+    # Limits may cut crunching at a point where processing fails, such combinations are skipped.
+    try:
+        glsl_db.crunch(mode, inlines, renames, simplifys, 1, renamer)
+    except (RuntimeError, ArithmeticError) as ee:
+        if is_verbose():
+            print("WARNING: GLSL search combination %s failed: %s" % (str(task[1:]), str(ee)))
+        return {"counts": None, "outputs": None}
+    return {"counts": glsl_db.getOperationCounts(), "outputs": glsl_db.getOutputs()}
+
+def glsl_search_init(data, verbose):
+    """Initialize a search process with pickled parsed sources."""
+    global g_glsl_search_sources
+    g_glsl_search_sources = data
+    set_verbose(verbose)
+
+def glsl_search_limits(count):
+    """Get limits to try for an operation that was performed given number of times without limits."""
+    ret = []
+    for ii in (0, count // 4, count // 2, (count * 3) // 4):
+        if (ii < count) and not (ii in ret):
+            ret += [ii]
+    return ret + [-1]
+
+def glsl_search_run(tasks, data, jobs, cache, key):
+    """Crunch with given tasks, loading memoised results where possible. Return dict of results by task."""
+    ret = {}
+    remaining = []
+    for ii in tasks:
+        if ii in ret:
+            continue
+        ret[ii] = None
+        if cache:
+            ret[ii] = cache.load(glsl_cache_key([key] + list(ii)))
+        if not ret[ii]:
+            remaining += [ii]
+    if not remaining:
+        return ret
+    if 1 < jobs:
+        with multiprocessing.Pool(min(jobs, len(remaining)), glsl_search_init, (data, is_verbose())) as pool:
+            results = pool.map(glsl_search_crunch, remaining)
+    else:
+        glsl_search_init(data, is_verbose())
+        results = list(map(glsl_search_crunch, remaining))
+    for (task, result) in zip(remaining, results):
+        ret[task] = result
+        if cache:
+            cache.store(glsl_cache_key([key] + list(task)), result)
+    return ret
+
+def glsl_search_score(op, compression):
+    """Score given output by its compressed size, using the same filters as compressing the binary."""
+    data = op.encode("utf-8")
+    # Dictionary larger than the data does not change the result, but allocating the preset dictionary is slow.
+    dict_size = max(len(data), 4096)
+    if "lzma" == compression:
+        filters = [{"id": lzma.FILTER_LZMA1, "preset": 9, "dict_size": dict_size, "lc": 1, "lp": 0, "pb": 0, "nice_len": 273}]
+        return len(lzma.compress(data, lzma.FORMAT_ALONE, filters=filters))
+    if "raw" == compression:
+        filters = [{"id": lzma.FILTER_LZMA2, "preset": 9 | lzma.PRESET_EXTREME, "dict_size": dict_size}]
+        return len(lzma.compress(data, lzma.FORMAT_RAW, filters=filters))
+    if "xz" == compression:
+        filters = [{"id": lzma.FILTER_LZMA2, "preset": 9, "dict_size": dict_size, "lc": 1, "pb": 0, "nice_len": 273}]
+        return len(lzma.compress(data, lzma.FORMAT_XZ, filters=filters))
+    raise RuntimeError("unknown compression format '%s'" % (compression))
@@ -0,0 +1,146 @@
+import cProfile
+import json
+import pstats
+import time
+import tracemalloc
+
+########################################
+# Globals ##############################
+########################################
+
+g_glsl_stats = None
+
+GLSL_STATS_COUNTS = ("conflict_checks", "flatten_calls", "flatten_rebuilds", "nodes_visited")
+
+GLSL_STATS_PHASES = ("read", "parse", "expand", "inline", "simplify", "swizzle", "rename", "collapse")
+
+########################################
+# GlslStats ############################
+########################################
+
+class GlslStats:
+    """Statistics of GLSL processing, accumulated per phase."""
+
+    def __init__(self, profile=None):
+        """Constructor."""
+        self.__phases = {}
+        self.__current = None
+        self.__profile = profile
+        self.__profiler = None
+        self.__sources = []
+        self.__start_cpu = None
+        self.__start_wall = None
+
+    def addCount(self, name, count=1):
+        """Add to a counter of the current phase. Counts outside phases are ignored."""
+        if self.__current:
+            self.__current[name] += count
+
+    def addSource(self, op):
+        """Add name of a source file processed."""
+        self.__sources += [op]
+
+    def beginPhase(self, name, size):
+        """Begin timing given phase. Phases may be entered several times, results accumulate."""
+        if self.__current:
+            raise RuntimeError("cannot begin GLSL phase '%s' within another phase" % (name))
+        if not (name in GLSL_STATS_PHASES):
+            raise RuntimeError("unknown GLSL phase: '%s'" % (name))
+        if name in self.__phases:
+            self.__current = self.__phases[name]
+        else:
+            self.__current = create_phase(name, size)
+            self.__phases[name] = self.__current
+        if name == self.__profile:
+            self.__profiler = cProfile.Profile()
+            self.__profiler.enable()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.__start_cpu = time.process_time()
+        self.__start_wall = time.perf_counter()
+
+    def endPhase(self, measure):
+        """End timing the current phase. Size after the phase is measured with given function outside of timing."""
+        wall_time = time.perf_counter() - self.__start_wall
+        cpu_time = time.process_time() - self.__start_cpu
+        # Memory is only known when tracing allocations, peak was reset at the beginning of the phase.
+        if tracemalloc.is_tracing():
+            (current, peak) = tracemalloc.get_traced_memory()
+            self.__current["memory_peak"] = max(self.__current["memory_peak"], peak)
+            self.__current["memory_after"] = current
+        if self.__profiler:
+            self.__profiler.disable()
+            print("GLSL profile of phase '%s':" % (self.__current["phase"]))
+            pstats.Stats(self.__profiler).sort_stats("cumulative").print_stats(40)
+            self.__profiler = None
+        self.__current["wall_time"] += wall_time
+        self.__current["cpu_time"] += cpu_time
+        self.__current["size_after"] = measure()
+        self.__current = None
+
+    def getPhases(self):
+        """Get listing of statistics of phases entered, in processing order."""
+        ret = []
+        for ii in GLSL_STATS_PHASES:
+            if ii in self.__phases:
+                ret += [self.__phases[ii]]
+        return ret
+
+    def getProfile(self):
+        """Accessor."""
+        return self.__profile
+
+    def merge(self, op):
+        """Merge statistics collected separately, e.g. in another process, for a disjoint set of sources."""
+        for ii in op.__sources:
+            self.addSource(ii)
+        for (name, phase) in op.__phases.items():
+            if not (name in self.__phases):
+                self.__phases[name] = create_phase(name, 0)
+            current = self.__phases[name]
+            for jj in ("wall_time", "cpu_time", "size_before", "size_after", "memory_after") + GLSL_STATS_COUNTS:
+                current[jj] += phase[jj]
+            current["memory_peak"] = max(current["memory_peak"], phase["memory_peak"])
+
+    def write(self, filename):
+        """Write statistics into a JSON file."""
+        phases = self.getPhases()
+        total = create_phase(None, 0)
+        for phase in phases:
+            for jj in ("wall_time", "cpu_time") + GLSL_STATS_COUNTS:
+                total[jj] += phase[jj]
+            total["memory_peak"] = max(total["memory_peak"], phase["memory_peak"])
+        if phases:
+            total["size_before"] = phases[0]["size_before"]
+            total["size_after"] = phases[-1]["size_after"]
+            total["memory_after"] = phases[-1]["memory_after"]
+        del total["phase"]
+        fd = open(filename, "w")
+        json.dump({"sources": self.__sources, "phases": phases, "total": total}, fd, indent=2)
+        fd.write("\n")
+        fd.close()
+
+########################################
+# Functions ############################
+########################################
+
+def create_phase(name, size):
+    """Create an empty statistics entry for a phase."""
+    ret = {"phase": name, "wall_time": 0.0, "cpu_time": 0.0, "size_before": size, "size_after": size, "memory_peak": 0, "memory_after": 0}
+    for ii in GLSL_STATS_COUNTS:
+        ret[ii] = 0
+    return ret
+
+def get_glsl_stats():
+    """Get global GLSL statistics, None if not collecting."""
+    return g_glsl_stats
+
+def glsl_stats_count(name, count=1):
+    """Add to a counter of global GLSL statistics if collecting."""
+    if g_glsl_stats:
+        g_glsl_stats.addCount(name, count)
+
+def set_glsl_stats(op):
+    """Set global GLSL statistics, None to stop collecting."""
+    global g_glsl_stats
+    g_glsl_stats = op
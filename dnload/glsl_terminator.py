@@ -5,10 +5,16 @@
 class GlslTerminator:
     """Terminator class."""
 
+    __slots__ = ("__terminator",)
+
     def __init__(self, source):
         """Constructor."""
         self.__terminator = source
 
+    def clone(self):
+        """Terminators are never modified, the same object can be used in another location."""
+        return self
+
     def format(self, force):
         """Return formatted output."""
         return self.__terminator
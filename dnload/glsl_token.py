@@ -17,6 +17,8 @@ from dnload.glsl_type import is_glsl_type
 class GlslToken:
     """Holds single instance of a GLSL token. Actually more of a token container."""
 
+    __slots__ = ("__left", "__middle", "__parent", "__right")
+
     def __init__(self, token):
         """Constructor."""
         self.__parent = None
@@ -84,10 +86,16 @@ class GlslToken:
             right_number = right.getInt()
         if (left_number is None) or (right_number is None):
             raise RuntimeError("error getting number values")
+        # Division by zero is left for the shader compiler to deal with.
+        if (oper in ("/", "%")) and (right_number == 0):
+            return None
         # Perform operation.
         result_number = oper.applyOperator(left_number, right_number)
         # Replace content of this with the result number
         if is_glsl_float(left) or is_glsl_float(right):
+            # Sums and differences need no more decimals than the operands, drop floating point error.
+            if not oper.requiresTruncation():
+                result_number = round(result_number, max(get_decimals(left), get_decimals(right)))
             number_string = str(float(result_number))
             (integer_part, decimal_part) = number_string.split(".")
             result_number = interpret_float(integer_part, decimal_part)
@@ -105,19 +113,7 @@ class GlslToken:
         if (len(self.__left) == 0) and (len(self.__right) == 0) and (len(self.__middle) == 1):
             middle = self.__middle[0]
             if is_glsl_token(middle):
-                self.__left = middle.__left
-                for ii in self.__left:
-                    ii.setParent(None)
-                    ii.setParent(self)
-                self.__right = middle.__right
-                for ii in self.__right:
-                    ii.setParent(None)
-                    ii.setParent(self)
-                self.__middle = middle.__middle
-                for ii in self.__middle:
-                    if is_glsl_token(ii):
-                        ii.setParent(None)
-                        ii.setParent(self)
+                self.replaceContent(middle)
                 # Retry.
                 self.collapse()
                 return
@@ -213,6 +209,38 @@ class GlslToken:
         # Replace parent in its parent with the remaining element.
         parent.replaceInParent(remaining)
 
+    def findElementAfter(self, op):
+        """Find element following given child of this in flattened order. Return the element and the token containing it."""
+        children = self.__left + self.__middle + self.__right
+        for ii in range(len(children)):
+            if children[ii] is op:
+                for jj in children[ii + 1:]:
+                    if not is_glsl_token(jj):
+                        return (jj, self)
+                    (element, owner) = jj.findFirstElement()
+                    if not (element is None):
+                        return (element, owner)
+                if self.__parent:
+                    return self.__parent.findElementAfter(self)
+                return (None, None)
+        raise RuntimeError("'%s' is not a child of '%s'" % (str(op), str(self)))
+
+    def findElementBefore(self, op):
+        """Find element preceding given child of this in flattened order. Return the element and the token containing it."""
+        children = self.__left + self.__middle + self.__right
+        for ii in range(len(children)):
+            if children[ii] is op:
+                for jj in reversed(children[:ii]):
+                    if not is_glsl_token(jj):
+                        return (jj, self)
+                    (element, owner) = jj.findLastElement()
+                    if not (element is None):
+                        return (element, owner)
+                if self.__parent:
+                    return self.__parent.findElementBefore(self)
+                return (None, None)
+        raise RuntimeError("'%s' is not a child of '%s'" % (str(op), str(self)))
+
     def findEqualToken(self, orig):
         """Find a token or a number that has equal priority to given token."""
         mid = self.getSingleChildMiddleNonToken()
@@ -248,6 +276,16 @@ class GlslToken:
             return rt.findEqualToken(orig)
         return (None, None)
 
+    def findFirstElement(self):
+        """Find first element of this in flattened order. Return the element and the token containing it."""
+        for ii in self.__left + self.__middle + self.__right:
+            if not is_glsl_token(ii):
+                return (ii, self)
+            (element, owner) = ii.findFirstElement()
+            if not (element is None):
+                return (element, owner)
+        return (None, None)
+
     def findHighestPrioOperatorMiddle(self):
         """Find highest priority operator from elements in the middle."""
         prio = -1
@@ -279,14 +317,15 @@ class GlslToken:
             return mid
         return self.__parent.findSiblingOperatorRight()
 
-    def findRightSiblingElementFromParentTree(self, elem):
-        """Find element next to given element from parent tree of this."""
-        lst = self.flattenParentTree()
-        for ii in range(len(lst)):
-            if lst[ii] is elem:
-                if ii < (len(lst) - 1):
-                    return lst[ii + 1]
-        return None
+    def findLastElement(self):
+        """Find last element of this in flattened order. Return the element and the token containing it."""
+        for ii in reversed(self.__left + self.__middle + self.__right):
+            if not is_glsl_token(ii):
+                return (ii, self)
+            (element, owner) = ii.findLastElement()
+            if not (element is None):
+                return (element, owner)
+        return (None, None)
 
     def flatten(self):
         """Flatten this token into a list."""
@@ -314,13 +353,6 @@ class GlslToken:
                 raise RuntimeError("empty element found during flatten")
         return ret
 
-    def flattenParentTree(self):
-        """Flatten complete parent tree this node is contained in."""
-        parent = self
-        while parent.__parent:
-            parent = parent.__parent
-        return parent.flatten()
-
     def flattenString(self):
         """Flatten this token into a string."""
         ret = ""
@@ -329,6 +361,13 @@ class GlslToken:
             ret += ii.format(False)
         return ret
 
+    def formatTree(self):
+        """Format tree structure of this token as nested {left|middle|right} groups."""
+        lst = []
+        for ii in (self.__left, self.__middle, self.__right):
+            lst += [" ".join(map(lambda x: x.formatTree() if is_glsl_token(x) else x.format(True), ii))]
+        return "{%s}" % ("|".join(lst))
+
     def getPrecedenceIfOperator(self):
         """Return precedence if middle element is a single child that is an operator."""
         mid = self.getSingleChildMiddleNonToken()
@@ -371,6 +410,27 @@ class GlslToken:
             return self.__right[0]
         return None
 
+    def isCollapsible(self):
+        """Tell if this can be collapsed into its parent, leaving the other child of the parent in its place."""
+        if not self.__parent:
+            return False
+        return bool(self.__parent.getSingleChildLeft() and self.__parent.getSingleChildRight())
+
+    def isUnaryMinusOperand(self, prio):
+        """Tell if this is preceded by an unary minus that would no longer apply to all of this without parens.
+        Unary minus applies before any operator of given precedence within this."""
+        if not self.__parent:
+            return False
+        (minus, owner) = self.__parent.findElementBefore(self)
+        if minus != "-":
+            return False
+        (prev, ignored) = owner.findElementBefore(minus)
+        # Minus is binary if preceded by an operand.
+        if is_glsl_access(prev) or is_glsl_name(prev) or is_glsl_number(prev) or (prev in (")", "]")):
+            return False
+        # Negation commutes with multiplication and division unless the negated value is a divisor.
+        return (prio > 1) or (prev in ("/", "%"))
+
     def isSingleChildRight(self):
         """Tell if this is the single, right child of its parent."""
         if self.__parent and (self.__parent.getSingleChildRight() == self):
@@ -398,6 +458,24 @@ class GlslToken:
             return False
         return (self.__middle[1].getSingleChildMiddleNonToken() == "(")
 
+    def mergeIntoParent(self):
+        """Replace this in the middle of its parent with the middle elements of this, if there is nothing else in this.
+        Return true if merged."""
+        parent = self.__parent
+        if (not parent) or self.__left or self.__right or (len(self.__middle) <= 1):
+            return False
+        for ii in range(len(parent.__middle)):
+            if parent.__middle[ii] is self:
+                parent.__middle[ii:ii + 1] = self.__middle
+                for jj in self.__middle:
+                    if is_glsl_token(jj):
+                        jj.setParent(None)
+                        jj.setParent(parent)
+                self.__middle = []
+                self.__parent = None
+                return True
+        return False
+
     def removeChild(self, op):
         """Remove a child from this."""
         for ii in range(len(self.__left)):
@@ -433,6 +511,22 @@ class GlslToken:
         self.__right = []
         return True
 
+    def replaceContent(self, op):
+        """Replace all children of this with children of given token."""
+        self.__left = op.__left
+        for ii in self.__left:
+            ii.setParent(None)
+            ii.setParent(self)
+        self.__right = op.__right
+        for ii in self.__right:
+            ii.setParent(None)
+            ii.setParent(self)
+        self.__middle = op.__middle
+        for ii in self.__middle:
+            if is_glsl_token(ii):
+                ii.setParent(None)
+                ii.setParent(self)
+
     def replaceMiddle(self, op):
         """Replace middle content with something that is not a token."""
         self.__middle = []
@@ -459,73 +553,66 @@ class GlslToken:
                                (str(self), str(op), str(self.__parent)))
         self.__parent = op
 
-    def simplify(self):
-        """Perform any simple simplification and stop."""
-        # Remove parens.
-        if self.isSurroundedByParens():
-            middle_lst = self.flattenMiddle()
-            # Single expression.
-            if len(middle_lst) == 1:
-                if self.removeParens():
-                    return True
-            # Number or name with access.
-            elif len(middle_lst) == 2:
-                mid_lt = middle_lst[0]
-                mid_rt = middle_lst[1]
-                if (is_glsl_name(mid_lt) or is_glsl_number(mid_lt)) and is_glsl_access(mid_rt):
-                    if self.removeParens():
-                        return True
-            # Single function call or indexing (with potential access).
-            elif len(middle_lst) >= 3:
-                mid_name = middle_lst[0]
-                mid_opening = middle_lst[1]
-                last_index = -1
-                mid_ending = middle_lst[last_index]
-                # If last part is access, try the element before that instead.
-                if is_glsl_access(mid_ending) and (len(middle_lst) >= 4):
-                    last_index = -2
-                    mid_ending = middle_lst[last_index]
-                # Check for function call or indexing format.
-                if (is_glsl_name(mid_name) or is_glsl_type(mid_name)) and is_glsl_paren(mid_opening) and mid_opening.matches(mid_ending):
-                    if is_single_call_or_access_list(middle_lst[2:last_index], mid_opening):
-                        if self.removeParens():
-                            return True
-            # Only contains lower-priority operators compared to outside.
-            paren_rt = self.__right[0].getSingleChild()
-            elem_rt = self.findRightSiblingElementFromParentTree(paren_rt)
-            prio = self.findHighestPrioOperatorMiddle()
-            # Right element cannot be access or bracket.
-            if (prio >= 0) and (not is_glsl_access(elem_rt)) and (elem_rt != "["):
-                left = self.findSiblingOperatorLeft()
-                right = self.findSiblingOperatorRight()
-                if left:
-                    if left.getPrecedence() > prio:
-                        if right:
-                            if right.getPrecedence() >= prio:
-                                if self.removeParens():
-                                    return True
-                        else:
-                            if self.removeParens():
-                                return True
-                elif right:
-                    if right.getPrecedence() >= prio:
-                        if self.removeParens():
-                            return True
-                else:
-                    if self.removeParens():
-                        return True
+    def simplify(self, max_simplifys):
+        """Perform all found structural simplifications in one traversal. Return number of simplifications performed."""
+        ret = 0
+        # Parens need to be removed before descending, children look for operators from their parents.
+        removed = self.simplifyParens()
+        if removed:
+            self.collapse()
+            ret += 1
         # Recurse down.
-        for ii in self.__left:
-            if ii.simplify():
+        for ii in self.__left + self.__right + list(filter(is_glsl_token, self.__middle)):
+            if (max_simplifys >= 0) and (ret >= max_simplifys):
+                break
+            ret += ii.simplify(max_simplifys - ret)
+        # Perform operations only after removing any possible parens. Degenerate tree is collapsed after every change.
+        if ((max_simplifys < 0) or (ret < max_simplifys)) and self.simplifyOperator():
+            self.collapse()
+            ret += 1
+        # Elements no longer enclosed in parens belong to the enclosing group, where operators within them are visible.
+        if removed:
+            self.mergeIntoParent()
+        return ret
+
+    def simplifyConstants(self, max_simplifys):
+        """Simplify remaining constants in one traversal. Return number of simplifications performed."""
+        ret = 0
+        for ii in self.__left + self.__right + list(filter(is_glsl_token, self.__middle)):
+            if (max_simplifys >= 0) and (ret >= max_simplifys):
+                return ret
+            ret += ii.simplifyConstants(max_simplifys - ret)
+        if ((max_simplifys < 0) or (ret < max_simplifys)) and self.simplifyNumber():
+            ret += 1
+        return ret
+
+    def simplifyNumber(self):
+        """Simplify remaining constant, if possible."""
+        mid = self.getSingleChildMiddleNonToken()
+        if mid and is_glsl_float(mid) and (abs(mid.getFloat()) <= 2147483647.0) and (not mid.isIntegrifyAllowed()):
+            # No operators, left or right. Sign may have been taken as operand of another operator.
+            left = self.findSiblingOperatorLeft()
+            right = self.findSiblingOperatorRight()
+            sign = None
+            if self.__parent:
+                (sign, ignored) = self.__parent.findElementBefore(self)
+            if (not left) and (not right) and (not (sign in ("-", "+"))):
+                mid.setAllowIntegrify(True)
                 return True
-        for ii in self.__right:
-            if ii.simplify():
+            # Alone in vecN() directive.
+            left = self.getSingleChildLeft()
+            right = self.getSingleChildRight()
+            if left and left.isTypeOpen() and right and (right.getSingleChildMiddleNonToken() == ")"):
+                mid.setAllowIntegrify(True)
                 return True
-        for ii in self.__middle:
-            if is_glsl_token(ii):
-                if ii.simplify():
-                    return True
-        # Perform operations only after removing any possible parens.
+            # If could not be integrified, at least ensure that float precision is not exceeded.
+            if mid.getPrecision() > 6:
+                mid.truncatePrecision(6)
+                return True
+        return False
+
+    def simplifyOperator(self):
+        """Apply operator or collapse identity, if possible."""
         if (len(self.__middle) == 1):
             oper = self.__middle[0]
             if is_glsl_operator(oper) and oper.isApplicable():
@@ -547,7 +634,13 @@ class GlslToken:
                             right_token.removeFromParent()
                             self.__middle = [result]
                             return True
-                    # Nontrivial cases.
+                    # Nontrivial cases eliminate the upper token, it must have another child to replace it with.
+                    if left_parent is self:
+                        collapsed = right_token
+                    else:
+                        collapsed = left_token
+                    if not collapsed.isCollapsible():
+                        return False
                     left_oper = left_parent.getSingleChildMiddleNonToken()
                     right_oper = right_parent.getSingleChildMiddleNonToken()
                     result = None
@@ -558,10 +651,10 @@ class GlslToken:
                     elif left_parent == right_parent:
                         result = self.applyOperator(left_oper, left_token, right_token)
                     # Substract addition: <something> - a + b => <something> + (b - a)
-                    elif (left_oper == "-") and (oper == "+") and (oper is right_oper):
+                    elif (left_oper == "-") and (oper == "+") and (oper is right_oper) and left_token.isSingleChildRight():
                         result = self.applyOperator(left_oper, right_token, left_token)
                         # If b - a is negative, replace it with its absolute value which is going to get subtracted.
-                        if result.getFloat() < 0.0:
+                        if (not (result is None)) and (result.getFloat() < 0.0):
                             right_oper.setOperator("-")
                             if is_glsl_int(result):
                                 result = interpret_int(str(abs(result.getInt())))
@@ -574,32 +667,71 @@ class GlslToken:
                     # TODO: further cases.
                     # On success, eliminate upper token (left only if necessary) and replace other token with result.
                     if result:
+                        collapsed.collapseUp()
                         if left_parent is self:
-                            right_token.collapseUp()
                             left_token.replaceMiddle(result)
                         else:
-                            left_token.collapseUp()
                             right_token.replaceMiddle(result)
                         return True
-        # Operations are done. Allow simplification of remaining constans, if possible.
-        mid = self.getSingleChildMiddleNonToken()
-        if mid and is_glsl_float(mid) and (abs(mid.getFloat()) <= 2147483647.0) and (not mid.isIntegrifyAllowed()):
-            # No operators, left or right.
-            left = self.findSiblingOperatorLeft()
-            right = self.findSiblingOperatorRight()
-            if (not left) and (not right):
-                mid.setAllowIntegrify(True)
-                return True
-            # Alone in vecN() directive.
-            left = self.getSingleChildLeft()
-            right = self.getSingleChildRight()
-            if left and left.isTypeOpen() and right and (right.getSingleChildMiddleNonToken() == ")"):
-                mid.setAllowIntegrify(True)
-                return True
-            # If could not be integrified, at least ensure that float precision is not exceeded.
-            if mid.getPrecision() > 6:
-                mid.truncatePrecision(6)
-                return True
+        return False
+
+    def simplifyParens(self):
+        """Remove enclosing parens, if possible."""
+        if self.isSurroundedByParens():
+            middle_lst = self.flattenMiddle()
+            # Single expression.
+            if len(middle_lst) == 1:
+                if self.removeParens():
+                    return True
+            # Number or name with access.
+            elif len(middle_lst) == 2:
+                mid_lt = middle_lst[0]
+                mid_rt = middle_lst[1]
+                if (is_glsl_name(mid_lt) or is_glsl_number(mid_lt)) and is_glsl_access(mid_rt):
+                    if self.removeParens():
+                        return True
+            # Single function call or indexing (with potential access).
+            elif len(middle_lst) >= 3:
+                mid_name = middle_lst[0]
+                mid_opening = middle_lst[1]
+                last_index = -1
+                mid_ending = middle_lst[last_index]
+                # If last part is access, try the element before that instead.
+                if is_glsl_access(mid_ending) and (len(middle_lst) >= 4):
+                    last_index = -2
+                    mid_ending = middle_lst[last_index]
+                # Check for function call or indexing format.
+                if (is_glsl_name(mid_name) or is_glsl_type(mid_name)) and is_glsl_paren(mid_opening) and mid_opening.matches(mid_ending):
+                    if is_single_call_or_access_list(middle_lst[2:last_index], mid_opening):
+                        if self.removeParens():
+                            return True
+            # Only contains lower-priority operators compared to outside.
+            elem_rt = None
+            if self.__parent:
+                (elem_rt, ignored) = self.__parent.findElementAfter(self)
+            prio = self.findHighestPrioOperatorMiddle()
+            if self.isUnaryMinusOperand(prio):
+                return False
+            # Right element cannot be access or bracket.
+            if (prio >= 0) and (not is_glsl_access(elem_rt)) and (elem_rt != "["):
+                left = self.findSiblingOperatorLeft()
+                right = self.findSiblingOperatorRight()
+                if left:
+                    if left.getPrecedence() > prio:
+                        if right:
+                            if right.getPrecedence() >= prio:
+                                if self.removeParens():
+                                    return True
+                        else:
+                            if self.removeParens():
+                                return True
+                elif right:
+                    if right.getPrecedence() >= prio:
+                        if self.removeParens():
+                            return True
+                else:
+                    if self.removeParens():
+                        return True
         return False
 
     def __str__(self):
@@ -612,6 +744,12 @@ class GlslToken:
 # Functions ############################
 ########################################
 
+def get_decimals(op):
+    """Get number of decimals expressed by given number."""
+    if is_glsl_float(op):
+        return op.getDecimals()
+    return 0
+
 def is_glsl_number(op):
     """Tell if given object is a number."""
     if is_glsl_float(op) or is_glsl_int(op):
@@ -671,115 +809,135 @@ def token_list_create(lst):
             ret += [ii]
     return ret
 
+def token_list_clone(lst):
+    """Clone a list of tokens so that no element is shared with the original, except for immutable ones."""
+    clones = {}
+    ret = []
+    for ii in lst:
+        cloned = ii.clone()
+        clones[id(ii)] = cloned
+        ret += [cloned]
+    # Links between names and accesses within the list must point to the clones.
+    for ii in ret:
+        if is_glsl_access(ii) or is_glsl_name(ii):
+            ii.relink(clones)
+    return ret
+
 def token_tree_build(lst):
-    """Builds and balances a token tree from given list."""
+    """Builds and balances a token tree from given list in one pass."""
     # Ensure all list elements are tokens.
     lst = token_list_create(lst)
     # Might be that everything is lost at this point.
     if not lst:
         return None
-    # Start iteration over tokenized list.
-    bracket_count = 0
-    paren_count = 0
-    first_bracket_index = -1
-    first_paren_index = -1
-    lowest_operator = None
-    lowest_operator_index = -1
-    for ii in range(len(lst)):
-        vv = lst[ii].getSingleChild()
-        # Count parens.
+    # Parens and brackets form groups as soon as they are closed, outer levels wait in the stack.
+    stack = []
+    current = []
+    for ii in lst:
+        vv = ii.getSingleChild()
         if is_glsl_paren(vv):
-            # Bracket case.
-            if vv.isBracket():
-                new_bracket_count = vv.updateBracket(bracket_count)
-                if new_bracket_count == bracket_count:
-                    raise RuntimeError("wut?")
-                bracket_count = new_bracket_count
-                # Split on brackets reaching 0.
-                if 0 >= bracket_count:
-                    if 0 > first_bracket_index:
-                        raise RuntimeError("bracket inconsistency")
-                    return token_tree_split_paren(lst, first_bracket_index, ii)
-                elif (1 == bracket_count) and (0 > first_bracket_index):
-                    first_bracket_index = ii
-            # Paren case.
-            elif vv.isParen():
-                new_paren_count = vv.updateParen(paren_count)
-                if new_paren_count == paren_count:
-                    raise RuntimeError("wut?")
-                paren_count = new_paren_count
-                # Split on parens reaching 0.
-                if 0 >= paren_count:
-                    if 0 > first_paren_index:
-                        raise RuntimeError("paren inconsistency")
-                    return token_tree_split_paren(lst, first_paren_index, ii)
-                elif (1 == paren_count) and (0 > first_paren_index):
-                    first_paren_index = ii
-            # Curly braces impossible.
-            else:
+            if vv.isCurlyBrace():
                 raise RuntimeError("unknown paren object '%s'" % (str(vv)))
-        # If we're not within parens, consider operators.
-        if is_glsl_operator(vv) and (0 >= bracket_count) and (0 >= paren_count):
-            if (not lowest_operator) or (vv < lowest_operator):
-                lowest_operator = vv
-                lowest_operator_index = ii
-    # Iteration done. Make a tiny subtree on the lowest operator position and continue.
-    if lowest_operator:
-        ret = GlslToken(lowest_operator)
-        left_block = []
-        right_block = []
-        left = None
-        right = None
-        # Get extending list left and right.
-        if lowest_operator_index >= 2:
-            left_block = lst[:(lowest_operator_index - 1)]
-        if lowest_operator_index <= len(lst) - 3:
-            right_block = lst[(lowest_operator_index + 2):]
-        # Check for left existing.
-        if lowest_operator_index >= 1:
-            left = lst[lowest_operator_index - 1]
-            ret.addLeft(left)
-        elif not (lowest_operator in ("-", "++", "--", "!")):
-            raise RuntimeError("left component nonexistent for operator '%s'" % (str(lowest_operator)))
-        # Check for right existing.
-        if lowest_operator_index <= len(lst) - 2:
-            right = lst[lowest_operator_index + 1]
-            ret.addRight(right)
-        elif not (lowest_operator in ("++", "--")):
-            raise RuntimeError("right component nonexistent for operator '%s'" % (str(lowest_operator)))
-        return token_tree_build(left_block + [ret] + right_block)
-    # Only option at this point is that the list has no operators and no parens - return as itself.
-    return GlslToken(lst)
-
-def token_tree_simplify(op):
-    """Perform first found simplify operation for given tree."""
-    op.collapse()
-    if op.simplify():
-        return True
-    return False
-
-def token_tree_split_paren(lst, first, last):
-    """Split token tree for parens."""
+            if vv in ("(", "["):
+                stack += [(current, ii)]
+                current = []
+                continue
+            if not stack:
+                raise RuntimeError("paren inconsistency")
+            (outer, opening) = stack.pop()
+            if not opening.getSingleChild().matches(vv):
+                raise RuntimeError("paren inconsistency")
+            current = token_tree_close_paren(outer, opening, current, ii)
+            continue
+        current += [ii]
+    if stack:
+        raise RuntimeError("paren inconsistency")
+    return token_tree_merge_operators(current)
+
+def token_tree_close_paren(lst, opening, middle, closing):
+    """Append a closed paren group to a token list. Return the list."""
     # Read types, names or accesses left.
-    left = [lst[first]]
-    iter_left = first - 1
-    while iter_left >= 0:
-        prospect = lst[iter_left].getSingleChild()
+    first = len(lst)
+    while first > 0:
+        prospect = lst[first - 1].getSingleChild()
         if is_glsl_access(prospect) or is_glsl_name(prospect) or is_glsl_type(prospect):
-            left = [lst[iter_left]] + left
-            iter_left -= 1
+            first -= 1
         else:
             break
     # Left may be multiple elements.
-    if 1 < len(left):
-        left = GlslToken(left)
+    if first < len(lst):
+        left = GlslToken(lst[first:] + [opening])
+        del lst[first:]
     else:
-        left = left[0]
+        left = opening
     # It's ok to have empty parens, as opposed to empty brackets.
-    middle = token_tree_build(lst[first + 1:last])
-    right = lst[last]
+    middle = token_tree_merge_operators(middle)
     # Create split.
     ret = GlslToken(middle)
     ret.addLeft(left)
-    ret.addRight(right)
-    return token_tree_build(lst[:iter_left + 1] + [ret] + lst[last + 1:])
+    ret.addRight(closing)
+    lst += [ret]
+    return lst
+
+def token_tree_merge_operators(lst):
+    """Merge operators in a list without parens into subtrees, leftmost of lowest precedence first."""
+    if not lst:
+        return None
+    # Bucket operator positions by precedence, within buckets positions are already in order.
+    levels = {}
+    for ii in range(len(lst)):
+        vv = lst[ii].getSingleChild()
+        if is_glsl_operator(vv):
+            precedence = vv.getPrecedence()
+            if precedence in levels:
+                levels[precedence] += [ii]
+            else:
+                levels[precedence] = [ii]
+    # Neighbors are kept in a linked list so merging does not need to rebuild the list.
+    prev_index = list(range(-1, len(lst) - 1))
+    next_index = list(range(1, len(lst) + 1))
+    merged = [False] * len(lst)
+    for kk in sorted(levels.keys()):
+        for ii in levels[kk]:
+            # Operators may have been consumed as operands of a previous operator.
+            if merged[ii]:
+                continue
+            operator = lst[ii].getSingleChild()
+            ret = GlslToken(operator)
+            # Check for left existing.
+            left = prev_index[ii]
+            if left >= 0:
+                ret.addLeft(lst[left])
+                merged[left] = True
+                prev_index[ii] = prev_index[left]
+                if prev_index[ii] >= 0:
+                    next_index[prev_index[ii]] = ii
+            elif not (operator in ("-", "++", "--", "!")):
+                raise RuntimeError("left component nonexistent for operator '%s'" % (str(operator)))
+            # Check for right existing.
+            right = next_index[ii]
+            if right < len(lst):
+                ret.addRight(lst[right])
+                merged[right] = True
+                next_index[ii] = next_index[right]
+                if next_index[ii] < len(lst):
+                    prev_index[next_index[ii]] = ii
+            elif not (operator in ("++", "--")):
+                raise RuntimeError("right component nonexistent for operator '%s'" % (str(operator)))
+            lst[ii] = ret
+    # Only option at this point is that the list has no operators and no parens - return as itself.
+    return GlslToken([lst[ii] for ii in range(len(lst)) if not merged[ii]])
+
+def token_tree_simplify(op, max_simplifys):
+    """Perform simplification rounds on given tree until no more simplifications are found."""
+    ret = 0
+    op.collapse()
+    while (max_simplifys < 0) or (ret < max_simplifys):
+        simplifys = op.simplify(max_simplifys - ret)
+        # Constants are only simplified after there are no structural changes left.
+        if not simplifys:
+            simplifys = op.simplifyConstants(max_simplifys - ret)
+            if not simplifys:
+                break
+        ret += simplifys
+    return ret
@@ -0,0 +1,62 @@
+########################################
+# GlslTokenCursor ######################
+########################################
+
+class GlslTokenCursor:
+    """Read position within a token array shared by all cursors created from it, bounded by an end position."""
+
+    def __init__(self, tokens, first=0, last=None):
+        """Constructor."""
+        self.__tokens = tokens
+        self.__first = first
+        if last is None:
+            last = len(tokens)
+        self.__last = last
+
+    def __add__(self, other):
+        """Concatenation, creates a list."""
+        return list(self) + list(other)
+
+    def __getitem__(self, key):
+        """Access operator. Slicing creates a new cursor into the same token array."""
+        if isinstance(key, slice):
+            (first, last, step) = key.indices(len(self))
+            if 1 != step:
+                raise RuntimeError("token cursor cannot be sliced with step %i" % (step))
+            return GlslTokenCursor(self.__tokens, self.__first + first, self.__first + max(first, last))
+        if key < 0:
+            key += len(self)
+        if (key < 0) or (key >= len(self)):
+            raise IndexError("token cursor index out of range")
+        return self.__tokens[self.__first + key]
+
+    def __iter__(self):
+        """Iterator."""
+        for ii in range(self.__first, self.__last):
+            yield self.__tokens[ii]
+
+    def __len__(self):
+        """Number of tokens remaining."""
+        return self.__last - self.__first
+
+    def __radd__(self, other):
+        """Concatenation from the right, creates a list."""
+        return list(other) + list(self)
+
+    def __str__(self):
+        """String representation."""
+        return str(list(map(str, self)))
+
+########################################
+# Functions ############################
+########################################
+
+def glsl_token_cursor(tokens):
+    """Get a cursor for given tokens. Tokens that already are a cursor are returned as-is."""
+    if is_glsl_token_cursor(tokens):
+        return tokens
+    return GlslTokenCursor(tokens)
+
+def is_glsl_token_cursor(op):
+    """Tell if given object is a GLSL token cursor."""
+    return isinstance(op, GlslTokenCursor)
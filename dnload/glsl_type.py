@@ -7,6 +7,8 @@ import re
 class GlslType:
     """GLSL type identifier."""
 
+    __slots__ = ("__modifier", "__pseudo_type", "__type")
+
     def __init__(self, modifier, source):
         """Constructor."""
         self.__modifier = modifier
@@ -14,6 +16,10 @@ class GlslType:
         # Save the flag so this type may check for errors.
         self.__pseudo_type = match_pseudo_type_id(self.__type)
 
+    def clone(self):
+        """Types are never modified, the same object can be used in another location."""
+        return self
+
     def format(self, force):
         """Return formatted output."""
         if self.__pseudo_type:
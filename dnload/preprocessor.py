@@ -1,7 +1,19 @@
+import re
+
 from dnload.common import is_verbose
 from dnload.common import run_command
 from dnload.compiler import Compiler
 
+########################################
+# Globals ##############################
+########################################
+
+g_preprocessor_macro = re.compile(r'^\s*#\s*(define|undef)\s+([A-Za-z_]\w*)', re.M)
+
+g_preprocessor_include = re.compile(r'^\s*#\s*include\b', re.M)
+
+g_preprocessor_sentinel = "__dnload_preprocessor_sentinel__"
+
 ########################################
 # Preprocessor #########################
 ########################################
@@ -13,6 +25,23 @@ class Preprocessor(Compiler):
         """Constructor."""
         Compiler.__init__(self, op)
 
+    def has_definition(self, op):
+        """Tell if given macro name is defined on the command line."""
+        for ii in self._definitions:
+            if ii[2:].split("=")[0] == op:
+                return True
+        return False
+
+    def is_batchable(self, op):
+        """Tell if given source can be preprocessed in a batch with other sources without affecting them.
+        Includes may be guarded to only pass once, and macros from the command line would not be restored."""
+        if (not self.supports_input()) or g_preprocessor_include.search(op):
+            return False
+        for (directive, name) in g_preprocessor_macro.findall(op):
+            if self.has_definition(name):
+                return False
+        return True
+
     def preprocess(self, op):
         """Preprocess a file, return output."""
         args = [self.get_command(), op] + self._compiler_flags_extra + self._definitions + self._include_directories
@@ -22,3 +51,56 @@ class Preprocessor(Compiler):
         if 0 < len(se) and is_verbose():
             print(se)
         return so
+
+    def preprocess_batch(self, lst):
+        """Preprocess given sources in one process, return listing of outputs.
+        Sources are given as listings of filename and content and are separated by sentinel lines. Line numbering
+        restarts for each source and macros defined by one source are undefined before the next."""
+        content = []
+        for (name, source) in lst:
+            content += [generate_line_directive(name), source, ""]
+            for ii in sorted(set(map(lambda x: x[1], g_preprocessor_macro.findall(source)))):
+                content += ["#undef %s" % (ii)]
+            content += [g_preprocessor_sentinel]
+        ret = []
+        segment = []
+        for ii in self.preprocess_input("\n".join(content) + "\n").splitlines():
+            if ii.strip() == g_preprocessor_sentinel:
+                # Blank lines at the end of input are dropped, do the same for each source.
+                while segment and (not segment[-1].strip()):
+                    segment.pop()
+                ret += ["\n".join(segment)]
+                segment = []
+            else:
+                segment += [ii]
+        if len(ret) != len(lst):
+            raise RuntimeError("preprocessing batch of %i sources produced %i outputs" % (len(lst), len(ret)))
+        return ret
+
+    def preprocess_input(self, op, path=None, name=None):
+        """Preprocess given source fed through standard input, return output.
+        Quoted includes are searched from given path as they would be for a file located there.
+        If name is given, it is reported as the filename of the source instead of standard input."""
+        if not self.supports_input():
+            raise RuntimeError("preprocessor '%s' does not read standard input" % (self.get_command()))
+        args = [self.get_command(), "-"] + self._compiler_flags_extra + self._definitions
+        if path:
+            args += ["-iquote", path]
+        if name:
+            op = generate_line_directive(name) + "\n" + op
+        (so, se) = run_command(args + self._include_directories, True, op)
+        if 0 < len(se) and is_verbose():
+            print(se)
+        return so
+
+    def supports_input(self):
+        """Tell if source can be fed to the preprocessor through standard input."""
+        return not self.command_basename_startswith("cl.")
+
+########################################
+# Functions ############################
+########################################
+
+def generate_line_directive(op):
+    """Generate a line directive restarting line numbering from the beginning of given file."""
+    return "#line 1 \"%s\"" % (op.replace("\\", "\\\\").replace("\"", "\\\""))
@@ -3,7 +3,9 @@
 import argparse
 import os
 import re
+import shutil
 import sys
+import tempfile
 
 (pathname, basename) = os.path.split(__file__)
 if pathname and (pathname != "."):
@@ -15,8 +17,119 @@ from dnload.common import is_verbose
 from dnload.common import run_command
 from dnload.common import set_verbose
 from dnload.custom_help_formatter import CustomHelpFormatter
+from dnload.glsl_cache import glsl_cache_directory
+from dnload.glsl_block import tokenize
+from dnload.glsl_block_statement import GlslBlockStatement
+from dnload.glsl_token import token_tree_build
 from dnload.preprocessor import Preprocessor
 
+########################################
+# Globals ##############################
+########################################
+
+g_regression_simplify = (
+  ("r = (data.x / -(data.y - data.z)) * data.w;", "r=data.x/-(data.y-data.z)*data.w;"),
+  ("r = data.x + -(-1.5 + 1.5 - 2.0);", "r=data.x+-(-1.5+1.5-2.);"),
+  ("x = ((u.x - 0.5));", "x=u.x-.5;"),
+  ("x = ((u.x * 2.0)) + b;", "x=u.x*2.+b;"),
+  ("x = -((c - -((2.0))));", "x=-(c- -2.);"),
+  ("x = a - -y;", "x=a- -y;"),
+  ("x = a * -2.0;", "x=a*-2.;"),
+)
+
+g_regression_sources = {
+  "alpha.vert.glsl" : """#version 430
+
+in vec2 vertex;
+out vec2 position;
+
+void main()
+{
+  float i_scale = 0.5 * 2.0;
+  position = vertex * i_scale;
+  gl_Position = vec4(vertex, 0.0, 1.0);
+}
+""",
+  "alpha.frag.glsl" : """#version 430
+
+uniform float time;
+in vec2 position;
+out vec4 output_color;
+
+float wave(float phase, float amplitude)
+{
+  return sin(phase * time) * amplitude;
+}
+
+void main()
+{
+  float brightness = wave(position.x, 0.5) + wave(position.y, 0.25);
+  output_color = vec4(brightness, position, 1.0);
+}
+""",
+  "beta.vert.glsl" : """#version 430
+
+in vec3 normal;
+in vec3 vertex;
+out vec3 direction;
+
+void main()
+{
+  direction = normalize(normal + vertex);
+  gl_Position = vec4(vertex, 1.0);
+}
+""",
+  "beta.frag.glsl" : """#version 430
+
+uniform vec3 light;
+in vec3 direction;
+out vec4 output_color;
+
+void main()
+{
+  float i_ambient = 0.1 + 0.1;
+  float diffuse = max(dot(direction, light), 0.0);
+  output_color = vec4(vec3(diffuse + i_ambient), 1.0);
+}
+""",
+  "gamma.glsl" : """#version 430
+
+uniform sampler2D texture_input;
+out vec4 output_color;
+
+void main()
+{
+  vec4 texel = texelFetch(texture_input, ivec2(gl_FragCoord.xy), 0);
+  output_color = vec4(texel.rgb * texel.a, 1.0);
+}
+""",
+}
+
+# Token tree shapes as nested {left|middle|right} groups.
+g_regression_trees = (
+  ("a + b * c", "{{|a|}|+|{{|b|}|*|{|c|}}}"),
+  ("a * b + c", "{{{|a|}|*|{|b|}}|+|{|c|}}"),
+  ("a - b - c", "{{{|a|}|-|{|b|}}|-|{|c|}}"),
+  ("a / b * c", "{{{|a|}|/|{|b|}}|*|{|c|}}"),
+  ("(a + b) * c", "{{{|(|}|{{|a|}|+|{|b|}}|{|)|}}|*|{|c|}}"),
+  ("a * (b + c)", "{{|a|}|*|{{|(|}|{{|b|}|+|{|c|}}|{|)|}}}"),
+  ("((a))", "{{|(|}|{{|(|}|a|{|)|}}|{|)|}}"),
+  ("-a * b", "{|-|{{|a|}|*|{|b|}}}"),
+  ("a * -b", "{|{{|a|}|*|{|-|}} {|b|}|}"),
+  ("a - -b", "{|{{|a|}|-|{|-|}} {|b|}|}"),
+  ("a % b + c", "{{{|a|}|%|{|b|}}|+|{|c|}}"),
+  ("x = a + b", "{{|x|}|=|{{|a|}|+|{|b|}}}"),
+  ("a = b = c", "{{{|a|}|=|{|b|}}|=|{|c|}}"),
+  ("f(a, b + c)", "{{|{|f|} {|(|}|}|{{|a|}|,|{{|b|}|+|{|c|}}}|{|)|}}"),
+  ("vec3(a.x, 1.0)", "{{|{|vec3|} {|(|}|}|{|a|} {{|.x|}|,|{|1.|}}|{|)|}}"),
+  ("u.x - 0.5", "{|{|u|} {{|.x|}|-|{|.5|}}|}"),
+  ("v[i + 1] * 2.0", "{{{|{|v|} {|[|}|}|{{|i|}|+|{|1|}}|{|]|}}|*|{|2.|}}"),
+  ("a < b && c", "{{{|a|}|<|{|b|}}|&&|{|c|}}"),
+  ("!a || b", "{{|!|{|a|}}||||{|b|}}"),
+  ("x += a * 2.0", "{{|x|}|+=|{{|a|}|*|{|2.|}}}"),
+  ("a ? b : c", "{{{|a|}|?|{|b|}}|:|{|c|}}"),
+)
+
 ########################################
 # Functions ############################
 ########################################
@@ -59,6 +172,81 @@ def find_executable(basename, pathname, path = "."):
     return find_executable(basename, pathname, new_path)
   return None
 
+def regression_cache(dl, directory):
+  """Check that crunched output round-trips through the cache both serially and in parallel."""
+  sources = write_sources(directory, ("alpha.vert.glsl", "alpha.frag.glsl", "beta.vert.glsl", "beta.frag.glsl"))
+  # Cache is redirected into the temporary directory, both for dnload and for finding the entries afterwards.
+  previous = os.environ.get("XDG_CACHE_HOME")
+  os.environ["XDG_CACHE_HOME"] = os.path.join(directory, "cache")
+  try:
+    for jobs in (1, 2):
+      command = ["python", dl] + sources + ["--glsl-jobs", str(jobs)]
+      (expected, se) = run_command(command + ["--no-glsl-cache"])
+      # First run stores the entry, second run loads it.
+      for ii in ("storing", "loading"):
+        (result, se) = run_command(command)
+        if result != expected:
+          raise RuntimeError("GLSL output with %i jobs differs when %s cache entry" % (jobs, ii))
+      if is_verbose():
+        print("GLSL cache round-trip with %i jobs" % (jobs))
+    entries = os.listdir(glsl_cache_directory())
+  finally:
+    if previous is None:
+      del os.environ["XDG_CACHE_HOME"]
+    else:
+      os.environ["XDG_CACHE_HOME"] = previous
+  # Number of processes does not affect output, serial and parallel crunching share the entry.
+  if 1 != len(entries):
+    raise RuntimeError("expected one GLSL cache entry for serial and parallel crunching, got %i" % (len(entries)))
+
+def regression_jobs(dl, directory):
+  """Check that crunching in parallel produces the same output as the serial path."""
+  alpha = write_sources(directory, ("alpha.vert.glsl", "alpha.frag.glsl"))
+  beta = write_sources(directory, ("beta.vert.glsl", "beta.frag.glsl"))
+  generic = write_sources(directory, ("gamma.glsl",))
+  # Unrelated chains are crunched in separate groups, generic source joins all sources into one group.
+  for sources in (alpha + beta, alpha + beta + generic, generic + alpha):
+    command = ["python", dl, "--no-glsl-cache"] + sources
+    (expected, se) = run_command(command + ["--glsl-jobs", "1"])
+    (result, se) = run_command(command + ["--glsl-jobs", "2"])
+    if result != expected:
+      raise RuntimeError("crunching %s with 2 jobs differs from serial crunching" % (str(list(map(os.path.basename, sources)))))
+  if is_verbose():
+    print("GLSL crunching with 2 jobs matches serial crunching")
+
+def regression_simplify():
+  """Check statement simplification against known results."""
+  for (src, expected) in g_regression_simplify:
+    block = GlslBlockStatement(tokenize(src))
+    block.simplify(-1)
+    result = block.format(True)
+    if result != expected:
+      raise RuntimeError("simplifying '%s' produced '%s', expected '%s'" % (src, result, expected))
+    if is_verbose():
+      print("Simplified '%s' -> '%s'" % (src, result))
+
+def regression_trees():
+  """Check token tree building against known tree shapes."""
+  for (src, expected) in g_regression_trees:
+    tree = token_tree_build(tokenize(src))
+    tree.collapse()
+    result = tree.formatTree()
+    if result != expected:
+      raise RuntimeError("building tree of '%s' produced '%s', expected '%s'" % (src, result, expected))
+    if is_verbose():
+      print("Built tree '%s' -> '%s'" % (src, result))
+
+def write_sources(directory, names):
+  """Write given regression sources into a directory, return listing of filenames."""
+  ret = []
+  for ii in names:
+    fname = os.path.join(directory, ii)
+    fd = open(fname, "w")
+    fd.write(g_regression_sources[ii])
+    fd.close()
+    ret += [fname]
+  return ret
+
 ########################################
 # Main #################################
 ########################################
@@ -71,6 +259,7 @@ def main():
   parser = argparse.ArgumentParser(usage = "GLSL minifying test.", formatter_class = CustomHelpFormatter, add_help = False)
   parser.add_argument("-h", "--help", action = "store_true", help = "Print this help string and exit.")
   parser.add_argument("--preprocessor", default = None, help = "Try to use given preprocessor executable as opposed to autodetect.")
+  parser.add_argument("--regression", action = "store_true", help = "Run regression checks instead of comparing against shader_minifier.")
   parser.add_argument("-v", "--verbose", action = "store_true", help = "Print more info about what is being done.")
   parser.add_argument("source", default = [], nargs = "*", help = "Source file(s) to process.")
  
@@ -86,6 +275,23 @@ def main():
   if args.verbose:
     set_verbose(True)
 
+  dl = find_executable("dnload.py", "dnload")
+  if is_verbose():
+    print("found dnload: '%s'" % (dl))
+
+  # Regression checks need no external tools.
+  if args.regression:
+    regression_simplify()
+    regression_trees()
+    directory = tempfile.mkdtemp()
+    try:
+      regression_cache(dl, directory)
+      regression_jobs(dl, directory)
+    finally:
+      shutil.rmtree(directory)
+    print("Regression checks passed.")
+    return 0
+
   # Source files to process.
   if not args.source:
     raise RuntimeError("no source files to process")
@@ -96,9 +302,6 @@ def main():
     else:
       raise RuntimeError("unknown source file: '%s'" % (ii))
 
-  dl = find_executable("dnload.py", "dnload")
-  if is_verbose():
-    print("found dnload: '%s'" % (dl))
   sm = find_executable("shader_minifier.exe", "Shader_Minifier")
   if is_verbose():
     print("found shader_minifier: '%s'" % (sm))
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+
+import argparse
+import gc
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+(pathname, basename) = os.path.split(__file__)
+if pathname and (pathname != "."):
+  sys.path.append(pathname + "/..")
+
+from dnload.common import set_temporary_directory
+from dnload.custom_help_formatter import CustomHelpFormatter
+from dnload.__main__ import generate_glsl
+from dnload.glsl import Glsl
+from dnload.glsl_block import tokenize
+from dnload.glsl_block import tokenize_lex
+from dnload.glsl_parse import glsl_parse_tokenized
+from dnload.glsl_stats import GlslStats
+from dnload.glsl_stats import set_glsl_stats
+from dnload.glsl_token_cursor import GlslTokenCursor
+from dnload.preprocessor import Preprocessor
+
+########################################
+# Globals ##############################
+########################################
+
+g_crunch_base = {"functions": 4, "locals": 4, "inlines": 4, "uniforms": 4, "structs": 1, "depth": 3}
+
+g_crunch_dimensions = ("functions", "locals", "inlines", "uniforms", "structs", "depth")
+
+########################################
+# Functions ############################
+########################################
+
+def benchmark_crunch(scales, repeats, preprocessor, baseline, write_baseline, tolerance):
+  """Time full crunching of synthetic shaders, scaling one shape parameter at a time. Return number of regressions.
+  Time is stored relative to a calibration workload run in the same process."""
+  calibration = calibrate(repeats)
+  print("Calibration: %.2f ms" % (calibration * 1000.0))
+  print("%20s %12s %12s %14s %14s %14s" % ("case", "time (ms)", "relative", "peak mem (MB)", "GLSL objects", "output bytes"))
+  results = {}
+  directory = tempfile.mkdtemp()
+  set_temporary_directory(directory)
+  try:
+    for ii in g_crunch_dimensions:
+      times = []
+      for jj in scales:
+        shape = dict(g_crunch_base)
+        shape[ii] *= jj
+        fname = os.path.join(directory, "benchmark.frag.glsl")
+        fd = open(fname, "w")
+        fd.write(generate_shader(**shape))
+        fd.close()
+        crunch = lambda: generate_glsl([fname], preprocessor, "USE_LD", "full", -1, -1, -1, "greedy", 1, None)
+        crunch_time = measure(crunch, repeats)
+        # Tracing allocations slows down execution, measure memory separately.
+        tracemalloc.start()
+        glsl_db = crunch()
+        (current, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # Databases of earlier cases have been released, GLSL objects alive are retained by this one.
+        (ignored, glsl_objects) = count_objects()
+        output = sum(map(lambda x: len(x.formatOutput()), glsl_db.getSources()))
+        glsl_db = None
+        name = "%s=%i" % (ii, shape[ii])
+        results[name] = {"time": round(crunch_time / calibration, 3), "memory": round(peak / (1024.0 * 1024.0), 3), "objects": glsl_objects, "output": output}
+        times += [crunch_time]
+        print("%20s %12.2f %12.3f %14.2f %14i %14i" % (name, crunch_time * 1000.0, results[name]["time"], results[name]["memory"], glsl_objects, output))
+      # Growth exponent estimates the complexity in given dimension.
+      if 1 < len(scales):
+        exponent = math.log(times[-1] / times[0]) / math.log(float(scales[-1]) / scales[0])
+        print("Scaling %s from x%i to x%i: %.2fx time, approximately O(n^%.2f)" % (ii, scales[0], scales[-1], times[-1] / times[0], exponent))
+  finally:
+    shutil.rmtree(directory)
+  if write_baseline:
+    fd = open(baseline, "w")
+    json.dump(results, fd, indent=2, sort_keys=True)
+    fd.write("\n")
+    fd.close()
+    print("Wrote baseline: '%s'" % (baseline))
+    return 0
+  if baseline:
+    return compare_baseline(results, baseline, tolerance)
+  return 0
+
+def benchmark_lexer(sizes, repeats):
+  """Time lexing and tokenization of synthetic sources of given sizes in kilobytes."""
+  print("%10s %14s %14s %14s" % ("size", "lex (ms)", "tokenize (ms)", "us / kB"))
+  per_kilobyte = []
+  for ii in sizes:
+    source = generate_source(ii * 1024)
+    lex_time = measure(lambda: list(tokenize_lex(source)), repeats)
+    tokenize_time = measure(lambda: tokenize(source), repeats)
+    kilobytes = len(source) / 1024.0
+    per_kilobyte += [tokenize_time / kilobytes]
+    print("%8.0fkB %14.2f %14.2f %14.2f" % (kilobytes, lex_time * 1000.0, tokenize_time * 1000.0, per_kilobyte[-1] * 1000000.0))
+  # Linear scaling keeps time per kilobyte constant.
+  if 1 < len(per_kilobyte):
+    print("Scaling from %ikB to %ikB: %.2fx time per kB" % (sizes[0], sizes[-1], per_kilobyte[-1] / per_kilobyte[0]))
+
+def benchmark_memory(sizes, preprocessor):
+  """Report peak and retained traced memory of each phase of crunching synthetic sources of given sizes in kilobytes.
+  Peak is reset at the beginning of every phase. Object counts are reported after crunching."""
+  print("%10s %10s %14s %14s" % ("size", "phase", "peak (MB)", "retained (MB)"))
+  directory = tempfile.mkdtemp()
+  set_temporary_directory(directory)
+  try:
+    for ii in sizes:
+      fname = os.path.join(directory, "benchmark.frag.glsl")
+      fd = open(fname, "w")
+      fd.write(generate_source(ii * 1024))
+      fd.close()
+      stats = GlslStats()
+      set_glsl_stats(stats)
+      tracemalloc.start()
+      try:
+        glsl_db = Glsl()
+        glsl_db.read(preprocessor, "USE_LD", fname)
+        glsl_db.parse()
+        glsl_db.crunch()
+        phases = stats.getPhases()
+        # Formatting is not a processing phase of its own.
+        tracemalloc.reset_peak()
+        glsl_db.format()
+        (current, peak) = tracemalloc.get_traced_memory()
+        phases += [{"phase": "format", "memory_peak": peak, "memory_after": current}]
+      finally:
+        tracemalloc.stop()
+        set_glsl_stats(None)
+      for jj in phases:
+        print("%8ikB %10s %14.2f %14.2f" % (ii, jj["phase"], jj["memory_peak"] / (1024.0 * 1024.0), jj["memory_after"] / (1024.0 * 1024.0)))
+      (objects, glsl_objects) = count_objects()
+      print("%8ikB %10s %14i objects, %i GLSL objects" % (ii, "total", objects, glsl_objects))
+  finally:
+    shutil.rmtree(directory)
+
+def benchmark_parser(sizes, repeats):
+  """Time parsing of tokenized synthetic sources of given sizes in kilobytes."""
+  print("%10s %14s %14s" % ("size", "parse (ms)", "us / kB"))
+  per_kilobyte = []
+  for ii in sizes:
+    source = generate_source(ii * 1024)
+    tokens = tokenize(source)
+    parse_time = measure(lambda: glsl_parse_tokenized(GlslTokenCursor(tokens)), repeats)
+    kilobytes = len(source) / 1024.0
+    per_kilobyte += [parse_time / kilobytes]
+    print("%8.0fkB %14.2f %14.2f" % (kilobytes, parse_time * 1000.0, per_kilobyte[-1] * 1000000.0))
+  if 1 < len(per_kilobyte):
+    print("Scaling from %ikB to %ikB: %.2fx time per kB" % (sizes[0], sizes[-1], per_kilobyte[-1] / per_kilobyte[0]))
+
+def calibrate(repeats):
+  """Return best time of a fixed workload independent of dnload, for normalizing times measured on different machines."""
+  return measure(lambda: sorted(map(str, range(200000)), reverse=True), repeats)
+
+def compare_baseline(results, baseline, tolerance):
+  """Compare benchmark results to a baseline file. Print and return number of regressions.
+  Only deterministic results fail the comparison, time and memory exceeding the tolerance are reported."""
+  fd = open(baseline, "r")
+  expected = json.load(fd)
+  fd.close()
+  ret = 0
+  for ii in sorted(results.keys()):
+    if not (ii in expected):
+      continue
+    result = results[ii]
+    reference = expected[ii]
+    # Output size and retained objects are deterministic, any growth is a regression.
+    for (jj, unit) in (("output", " bytes"), ("objects", " objects")):
+      if result[jj] > reference[jj]:
+        print("REGRESSION: %s %s %i%s, baseline %i%s" % (ii, jj, result[jj], unit, reference[jj], unit))
+        ret += 1
+    # Timer noise and interpreter version affect time and memory, they are for information only.
+    for (jj, unit) in (("time", "x calibration"), ("memory", "MB")):
+      if result[jj] > reference[jj] * (1.0 + tolerance):
+        print("NOTE: %s %s %.3f%s, baseline %.3f%s" % (ii, jj, result[jj], unit, reference[jj], unit))
+  if ret:
+    print("%i regression(s) against baseline '%s'" % (ret, baseline))
+  else:
+    print("No regressions against baseline '%s'" % (baseline))
+  return ret
+
+def count_objects():
+  """Count objects tracked by the garbage collector, total and GLSL objects only."""
+  gc.collect()
+  objects = gc.get_objects()
+  glsl_objects = 0
+  for ii in objects:
+    if type(ii).__name__.startswith("Glsl"):
+      glsl_objects += 1
+  return (len(objects), glsl_objects)
+
+def generate_expression(terms, depth):
+  """Generate an expression using all given terms, nested to given depth cycling through the terms."""
+  operators = ("+", "*", "-")
+  ret = "(%s)" % (" + ".join(terms))
+  for ii in range(1, depth + 1):
+    ret = "(%s %s %s)" % (terms[ii % len(terms)], operators[ii % len(operators)], ret)
+  return ret
+
+def generate_shader(functions, locals, inlines, uniforms, structs, depth):
+  """Generate a synthetic fragment shader of given shape. Locals named with 'i_' prefix are inline candidates."""
+  ret = ["#version 430\n\n"]
+  for ii in range(uniforms):
+    ret += ["uniform vec3 uniform_%i;\n" % (ii)]
+  for ii in range(structs):
+    ret += ["in Data%i\n{\n  vec3 position;\n  vec2 texcoord;\n} data_%i;\n" % (ii, ii)]
+  ret += ["out vec4 output_color;\n"]
+  calls = []
+  for ii in range(functions):
+    ret += ["\nfloat function_%i(vec3 position)\n{\n" % (ii)]
+    for jj in range(inlines):
+      ret += ["  vec3 i_offset_%i = position * %i.5 - uniform_%i;\n" % (jj, jj + 1, (ii + jj) % uniforms)]
+    terms = []
+    for jj in range(locals):
+      ret += ["  float local_%i = dot(i_offset_%i, data_%i.position) + %i.25;\n" % (jj, jj % inlines, (ii + jj) % structs, jj)]
+      terms += ["local_%i" % (jj)]
+    # Inline candidates not consumed by locals are used directly.
+    for jj in range(locals, inlines):
+      terms += ["i_offset_%i.x" % (jj)]
+    ret += ["  return %s;\n}\n" % (generate_expression(terms, depth))]
+    calls += ["function_%i(data_%i.position)" % (ii, ii % structs)]
+  # Access all members of all inout structs.
+  positions = " + ".join(map(lambda x: "data_%i.position" % (x), range(structs)))
+  texcoords = " + ".join(map(lambda x: "data_%i.texcoord" % (x), range(structs)))
+  ret += ["\nvoid main()\n{\n  output_color = vec4(%s + length(%s), %s, 1.0);\n}\n" % (" + ".join(calls), positions, texcoords)]
+  return "".join(ret)
+
+def generate_source(size):
+  """Generate synthetic GLSL source of at least given size in bytes."""
+  ret = ["uniform vec3 uniform_position;\n"]
+  length = sum(map(len, ret))
+  ii = 0
+  while length < size:
+    function = "float function_%i(vec3 position)\n{\n  vec3 offset = position * %i.5 - uniform_position.xyz;\n  return length(offset.xy) - dot(offset, vec3(1.0, 2.0, .5)) * 0.25;\n}\n" % (ii, ii)
+    ret += [function]
+    length += len(function)
+    ii += 1
+  return "".join(ret)
+
+def measure(func, repeats):
+  """Return best wall clock time of given function over given number of repeats."""
+  ret = None
+  for ii in range(repeats):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    if (ret is None) or (elapsed < ret):
+      ret = elapsed
+  return ret
+
+########################################
+# Main #################################
+########################################
+
+def main():
+  """Main function."""
+  benchmarks = ("crunch", "lexer", "memory", "parser")
+
+  parser = argparse.ArgumentParser(usage = "GLSL processing benchmarks.", formatter_class = CustomHelpFormatter, add_help = False)
+  parser.add_argument("-b", "--baseline", default = None, help = "Baseline file to compare crunch benchmark results against.")
+  parser.add_argument("-h", "--help", action = "store_true", help = "Print this help string and exit.")
+  parser.add_argument("-p", "--preprocessor", default = "cpp", help = "Preprocessor to use for crunch and memory benchmarks.\n(default: %(default)s)")
+  parser.add_argument("-r", "--repeats", default = 3, type = int, help = "Number of repeats, best time is reported.\n(default: %(default)s)")
+  parser.add_argument("-s", "--sizes", default = "25,50,100,200,400", help = "Comma-separated synthetic source sizes in kilobytes.\n(default: %(default)s)")
+  parser.add_argument("-S", "--scales", default = "1,2,4,8", help = "Comma-separated multipliers for synthetic shader shape in crunch benchmark.\n(default: %(default)s)")
+  parser.add_argument("-t", "--tolerance", default = 1.0, type = float, help = "Relative increase in time or memory over baseline to report. Only output size and object counts fail the comparison.\n(default: %(default)s)")
+  parser.add_argument("-w", "--write-baseline", action = "store_true", help = "Write crunch benchmark results into baseline file instead of comparing.")
+  parser.add_argument("benchmark", default = [], nargs = "*", help = "Benchmark(s) to run: %s. Default is to run all." % (", ".join(benchmarks)))
+
+  args = parser.parse_args()
+
+  if args.help:
+    print(parser.format_help().strip())
+    return 0
+
+  selected = args.benchmark
+  if not selected:
+    selected = benchmarks
+  for ii in selected:
+    if not (ii in benchmarks):
+      raise RuntimeError("unknown benchmark: '%s'" % (ii))
+  sizes = list(map(int, args.sizes.split(",")))
+  if args.write_baseline and not args.baseline:
+    raise RuntimeError("baseline file must be specified for writing")
+
+  ret = 0
+  if "crunch" in selected:
+    ret += benchmark_crunch(list(map(int, args.scales.split(","))), args.repeats, Preprocessor(args.preprocessor), args.baseline, args.write_baseline, args.tolerance)
+  if "lexer" in selected:
+    benchmark_lexer(sizes, args.repeats)
+  if "memory" in selected:
+    benchmark_memory(sizes, Preprocessor(args.preprocessor))
+  if "parser" in selected:
+    benchmark_parser(sizes, args.repeats)
+
+  if ret:
+    return 1
+  return 0
+
+########################################
+# Entry point ##########################
+########################################
+
+if __name__ == "__main__":
+  sys.exit(main())